@@ -0,0 +1,166 @@
+"""Бенчмарки основных операций на сгенерированных конфигурациях.
+
+Для каждого вендора генерируется пара конфигураций (текущая/целевая) заданного размера и
+замеряется скорость (операций в секунду) и пиковое потребление памяти (tracemalloc) для
+разбора, поиска, вычисления разницы, пост-обработки, сериализации и т.д.
+
+Запуск:
+    python -m benchmarks.run --lines 10000 --vendor huawei --vendor cisco
+    python -m benchmarks.run --lines 100000 --json bench.json
+    python -m benchmarks.run --lines 1000 --wide 20000 --vendor cisco
+"""
+
+import argparse
+import gc
+import json
+import re
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import Callable
+
+import ctreepo.postproc_fortinet  # noqa: F401
+from ctreepo import CTree, CTreeDiffer, CTreeEnv, CTreeSerializer, Vendor
+from ctreepo.postproc import _REGISTRY, process_rules
+
+from .generator import TAGGING_RULES, WIDE_SECTIONS, generate, generate_wide
+
+_FLEET_SIZE = 10
+
+
+@dataclass(frozen=True, slots=True)
+class BenchResult:
+    vendor: str
+    lines: int
+    operation: str
+    ops_per_sec: float
+    mean_ms: float
+    peak_memory_kb: float
+
+
+def _measure(func: Callable[[], object], repeat: int) -> tuple[float, float]:
+    # время - среднее по repeat запускам, память - пик за отдельный запуск под tracemalloc,
+    # так как tracemalloc заметно замедляет выполнение
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        _ = func()
+        timings.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    _ = func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return sum(timings) / len(timings), peak / 1024
+
+
+def _operations(vendor: Vendor, lines: int, changes: float) -> dict[str, Callable[[], object]]:
+    current_config = generate(vendor, lines=lines, seed=1)
+    target_config = generate(vendor, lines=lines, seed=1, changes=changes)
+
+    env = CTreeEnv(vendor, post_proc_rules=[])
+    tagged_env = CTreeEnv(vendor, tagging_rules=TAGGING_RULES[vendor], post_proc_rules=[])
+    current = tagged_env.parse(current_config)
+    target = tagged_env.parse(target_config)
+    diff = CTreeDiffer.diff(current, target, post_proc_rules=[])
+    data = CTreeSerializer.to_dict(current)
+    post_proc_rules = list(_REGISTRY[vendor])
+    # парк устройств с разной долей отличий от одной эталонной конфигурации
+    fleet = [
+        (indx, tagged_env.parse(generate(vendor, lines=lines, seed=1, changes=changes * (indx % 3))))
+        for indx in range(_FLEET_SIZE)
+    ]
+
+    def post_proc() -> CTree:
+        root = diff.copy()
+        process_rules(root, post_proc_rules)
+        return root
+
+    return {
+        "parse": lambda: env.parse(current_config),
+        "parse+tags": lambda: tagged_env.parse(current_config),
+        "search": lambda: tagged_env.search(current, include_tags=[TAGGING_RULES[vendor][0]["tags"][0]]),
+        "diff": lambda: CTreeDiffer.diff(current, target, post_proc_rules=[]),
+        "post_proc": post_proc,
+        "human_diff": lambda: CTreeDiffer.human_diff(current, target),
+        f"diff x{_FLEET_SIZE}": lambda: [CTreeDiffer.diff(c, target, post_proc_rules=[]) for _, c in fleet],
+        f"diff_many x{_FLEET_SIZE}": lambda: list(CTreeDiffer.diff_many(fleet, target, post_proc_rules=[])),
+        "patch": lambda: diff.patch,
+        "config": lambda: current.config,
+        "to_dict": lambda: CTreeSerializer.to_dict(current),
+        "from_dict": lambda: CTreeSerializer.from_dict(vendor, data),
+    }
+
+
+def _wide_operations(vendor: Vendor, width: int, changes: float) -> dict[str, Callable[[], object]]:
+    # секция с десятками тысяч строк одного уровня (acl, prefix-list)
+    env = CTreeEnv(vendor, post_proc_rules=[])
+    current = env.parse(generate_wide(vendor, width=width, seed=1))
+    target = env.parse(generate_wide(vendor, width=width, seed=1, changes=changes))
+    ordered_sections = [re.escape(WIDE_SECTIONS[vendor][0])]
+
+    return {
+        "wide:diff": lambda: CTreeDiffer.diff(current, target, post_proc_rules=[]),
+        "wide:ordered": lambda: CTreeDiffer.diff(
+            current,
+            target,
+            ordered_sections=ordered_sections,
+            post_proc_rules=[],
+        ),
+        "wide:lcs": lambda: CTreeDiffer.diff(
+            current,
+            target,
+            ordered_sections=ordered_sections,
+            ordered_mode="lcs",
+            post_proc_rules=[],
+        ),
+        "wide:human": lambda: CTreeDiffer.human_diff(current, target),
+    }
+
+
+def run(vendors: list[Vendor], lines: int, repeat: int, changes: float, wide: int = 0) -> list[BenchResult]:
+    results = []
+    for vendor in vendors:
+        operations = _operations(vendor, lines, changes)
+        if wide != 0:
+            operations |= _wide_operations(vendor, wide, changes)
+        for operation, func in operations.items():
+            mean, peak = _measure(func, repeat)
+            result = BenchResult(
+                vendor=vendor,
+                lines=lines,
+                operation=operation,
+                ops_per_sec=1 / mean if mean > 0 else float("inf"),
+                mean_ms=mean * 1000,
+                peak_memory_kb=peak,
+            )
+            results.append(result)
+            print(
+                f"{result.vendor:<10}{result.lines:>8}  {result.operation:<14}"
+                f"{result.ops_per_sec:>12.2f} ops/s{result.mean_ms:>12.2f} ms{result.peak_memory_kb:>14.1f} KiB",
+                flush=True,
+            )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="ctreepo benchmarks")
+    parser.add_argument("--vendor", action="append", choices=[v.value for v in Vendor], help="по умолчанию все")
+    parser.add_argument("--lines", type=int, default=10_000, help="размер конфигурации в строках")
+    parser.add_argument("--repeat", type=int, default=3, help="число замеров каждой операции")
+    parser.add_argument("--changes", type=float, default=0.05, help="доля измененных блоков в целевой конфигурации")
+    parser.add_argument("--wide", type=int, default=0, help="размер широкой секции (acl), 0 - не проверять")
+    parser.add_argument("--json", help="сохранить результаты в файл")
+    args = parser.parse_args()
+
+    vendors = [Vendor(v) for v in args.vendor] if args.vendor else list(Vendor)
+    print(f"{'vendor':<10}{'lines':>8}  {'operation':<14}{'speed':>18}{'mean':>15}{'peak memory':>18}")
+    results = run(vendors, args.lines, args.repeat, args.changes, args.wide)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump([asdict(r) for r in results], f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,9 @@
+from .cache import DiffCache, ParseCache
 from .ctree import CTree
 from .differ import CTreeDiffer
 from .environment import CTreeEnv
 from .factory import ctree_factory
+from .metrics import CTreeMetrics
 from .models import Vendor
 from .parser import CTreeParser
 from .postproc_arista import *
@@ -9,6 +11,7 @@ from .postproc_cisco import *
 from .postproc_huawei import *
 from .searcher import CTreeSearcher
 from .serializer import CTreeSerializer
+from .snapshot import CTreeSnapshot
 
 __all__ = [
     "CTreeDiffer",
@@ -19,4 +22,8 @@ __all__ = [
     "CTreeParser",
     "CTreeSearcher",
     "CTreeSerializer",
+    "CTreeSnapshot",
+    "ParseCache",
+    "DiffCache",
+    "CTreeMetrics",
 ]
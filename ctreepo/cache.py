@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import Hashable
+
+from .ctree import CTree
+from .models import CacheInfo, Vendor
+from .serializer import CTreeRecord
+
+__all__ = (
+    "ParseCache",
+    "DiffCache",
+)
+
+
+class ParseCache:
+    """Кеш разобранных конфигураций.
+
+    Ключ - хеш от вендора, текста конфигурации, шаблона и правил тегов, значение - дерево
+    в компактном виде (CTreeSerializer.to_records). Деревья хранятся в памяти (LRU) и,
+    если указан directory, на диске, поэтому кеш переживает перезапуск процесса.
+    """
+
+    def __init__(self, maxsize: int = 1024, directory: Path | str | None = None) -> None:
+        if maxsize < 1:
+            raise ValueError("maxsize should be positive")
+        self.maxsize = maxsize
+        self.directory = Path(directory) if directory is not None else None
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+        self._data: OrderedDict[str, list[CTreeRecord]] = OrderedDict()
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def key(vendor: Vendor, config: str, template_digest: str = "", rules_digest: str = "") -> str:
+        digest = hashlib.sha256(f"{vendor}\0{template_digest}\0{rules_digest}\0".encode())
+        digest.update(config.encode())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> list[CTreeRecord] | None:
+        records = self._data.get(key)
+        if records is not None:
+            self._data.move_to_end(key)
+            self._hits += 1
+            return records
+        if self.directory is not None:
+            try:
+                with open(self.directory / f"{key}.json", "r") as f:
+                    data = json.load(f)
+            except FileNotFoundError:
+                pass
+            else:
+                records = [(depth, line, tags, template, undo_line) for depth, line, tags, template, undo_line in data]
+                self._put(key, records)
+                self._disk_hits += 1
+                return records
+        self._misses += 1
+        return None
+
+    def set(self, key: str, records: list[CTreeRecord]) -> None:
+        self._put(key, records)
+        if self.directory is not None:
+            # пишем во временный файл и переименовываем, что бы не оставить недописанный файл
+            filename = self.directory / f"{key}.json"
+            tmp = filename.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp, "w") as f:
+                json.dump(records, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp, filename)
+
+    def _put(self, key: str, records: list[CTreeRecord]) -> None:
+        self._data[key] = records
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            _ = self._data.popitem(last=False)
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(
+            hits=self._hits,
+            disk_hits=self._disk_hits,
+            misses=self._misses,
+            size=len(self._data),
+            maxsize=self.maxsize,
+        )
+
+    def clear(self) -> None:
+        """Очистка кеша в памяти и счетчиков, файлы на диске не удаляются."""
+        self._data.clear()
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+
+
+class DiffCache:
+    """Кеш разницы по секциям верхнего уровня.
+
+    Ключ - хеши секции в текущей и целевой конфигурациях и параметры вычисления разницы,
+    значение - результат сравнения секции. Одинаковые секции (aaa, ntp, snmp-agent и т.п.)
+    повторяются на множестве устройств, поэтому при вычислении разницы для всего парка
+    большая часть секций берется из кеша.
+
+    Хеш узла не учитывает теги и шаблоны, поэтому кеш нужно использовать для деревьев,
+    полученных одним парсером с одним шаблоном, или разделять их через cache_scope в
+    CTreeDiffer.diff. CTreeEnv делает это сам, поэтому один кеш можно передать в несколько окружений.
+    """
+
+    def __init__(self, maxsize: int = 4096) -> None:
+        if maxsize < 1:
+            raise ValueError("maxsize should be positive")
+        self.maxsize = maxsize
+        self._data: OrderedDict[Hashable, list[CTree]] = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key: Hashable) -> list[CTree] | None:
+        # узлы из кеша только копируются при слиянии в diff (CTree.merge), поэтому
+        # отдаем их без дополнительного копирования
+        result = self._data.get(key)
+        if result is None:
+            self._misses += 1
+            return None
+        self._data.move_to_end(key)
+        self._hits += 1
+        return result
+
+    def set(self, key: Hashable, result: list[CTree]) -> None:
+        self._data[key] = result
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            _ = self._data.popitem(last=False)
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(
+            hits=self._hits,
+            disk_hits=0,
+            misses=self._misses,
+            size=len(self._data),
+            maxsize=self.maxsize,
+        )
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._hits = 0
+        self._misses = 0
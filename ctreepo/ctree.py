@@ -2,25 +2,52 @@ from __future__ import annotations
 
 import hashlib
 import re
+import sys
 from collections import deque
-from typing import Deque, Self
+from typing import Any, Deque, Iterable, Iterator, Literal, NoReturn, Self
 
 from . import settings
 from .models import Vendor
 
 __all__ = ("CTree",)
 
+# кеш скомпилированных паттернов: (класс, атрибут) -> (список, по которому компилировали, его длина, паттерн)
+_PATTERNS: dict[tuple[type, str], tuple[list[str], int, re.Pattern[str] | None]] = {}
+
+
+class _NoChildren(dict[str, Any]):
+    """Общий пустой словарь потомков для листьев уплотненного дерева (CTree.compact).
+
+    Изменять нельзя, потомков добавляем через CTree(parent=...) или merge, они заменяют
+    его обычным словарем. При pickle/copy/deepcopy остается тем же общим объектом.
+    """
+
+    __slots__ = ()
+
+    def _read_only(self, *args: Any, **kwargs: Any) -> NoReturn:
+        raise TypeError("children of a compacted leaf are read-only, add nodes with CTree(parent=...)")
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self) -> str:
+        return "_NO_CHILDREN"
+
+
+_NO_CHILDREN: dict[str, Any] = _NoChildren()
+
 
 class CTree:
     __slots__ = (
-        "line",  # строка настройки
-        "parent",  # родитель узла
+        "_line",  # строка настройки
+        "_parent",  # родитель узла
         "children",  # словарь с вложенными потомками узла
         "tags",  # теги узла
         "template",  # шаблон, что бы разобрать строку на команду и аргументы
         "undo_line",  # как удаляем строку, если не указано, то undo добавляем
         "prefix",  # префикс перед строкой, используется в human-diff (-/+)
-        "node_hash",  # хеш узла с учетом дочерних узлов
+        "_node_hash",  # хеш узла с учетом дочерних узлов, пустая строка - нужно пересчитать
+        "_path",  # формальный путь от корня (строки предков и самого узла), None - нужно вычислить
     )
 
     @property
@@ -78,6 +105,27 @@ class CTree:
 
     masking_string: str = settings.MASKING_STRING
 
+    @classmethod
+    def compiled_pattern(
+        cls,
+        name: Literal["junk_lines", "mask_patterns", "sections_without_exit", "sections_require_exit"],
+    ) -> re.Pattern[str] | None:
+        """Скомпилированное объединение (через "|") списка паттернов вендора.
+
+        Компилируется один раз на класс, перекомпилируется, если список в классе заменили,
+        переопределили в наследнике или изменили его длину (append и т.п.). Для пустого
+        списка возвращается None.
+        """
+        source: list[str] = getattr(cls, name)
+        cached = _PATTERNS.get((cls, name))
+        # вызывается на каждую строку (mask_line), поэтому сверяем сам объект списка и длину,
+        # а не содержимое. Ссылка на список хранится в кеше, поэтому id не переиспользуется
+        if cached is not None and cached[0] is source and cached[1] == len(source):
+            return cached[2]
+        pattern = re.compile("|".join(source)) if len(source) != 0 else None
+        _PATTERNS[(cls, name)] = (source, len(source), pattern)
+        return pattern
+
     def __init__(
         self,
         line: str = "",
@@ -85,9 +133,10 @@ class CTree:
         tags: list[str] | None = None,
         template: str = "",
     ) -> None:
-        self.line = line.strip()
+        self._line = line.strip()
 
-        self.parent = parent
+        self._parent = parent
+        self._path: tuple[str, ...] | None = None
         self.children: dict[str, Self] = {}
         self.prefix = ""
         if tags is not None:
@@ -98,7 +147,10 @@ class CTree:
             self.tags = []
 
         if parent is not None:
+            if parent.children is _NO_CHILDREN:
+                parent.children = {}
             parent.children[line.strip()] = self
+            parent._invalidate_hash()
 
         if len(template) != 0:
             self.template, self.undo_line = self._get_template_undo(self.line, template)
@@ -106,9 +158,28 @@ class CTree:
             self.template = ""
             self.undo_line = ""
 
-        # тут можно сразу считать, но смысла кмк нет пока неизвестны потомки, поэтому пересчет
-        # нужно делать после построения дерева
-        self.node_hash = ""
+        # хеш считается лениво при первом обращении к node_hash, а любые изменения дерева
+        # (новый потомок, удаление, изменение строки, rebuild) сбрасывают его у узла и предков
+        self._node_hash = ""
+
+    @property
+    def line(self) -> str:
+        return self._line
+
+    @line.setter
+    def line(self, line: str) -> None:
+        self._line = line
+        self._invalidate_hash()
+        self._invalidate_path()
+
+    @property
+    def parent(self) -> Self | None:
+        return self._parent
+
+    @parent.setter
+    def parent(self, parent: Self | None) -> None:
+        self._parent = parent
+        self._invalidate_path()
 
     def _get_template_undo(self, line: str, template: str) -> tuple[str, str]:
         if settings.TEMPLATE_SEPARATOR in template:
@@ -151,8 +222,8 @@ class CTree:
 
     @classmethod
     def mask_line(cls, line: str) -> str:
-        pattern: str = "|".join(cls.mask_patterns)  # type: ignore [arg-type]
-        if (m := re.fullmatch(pattern, line)) is not None:
+        pattern = cls.compiled_pattern("mask_patterns")
+        if pattern is not None and (m := pattern.fullmatch(line)) is not None:
             secret = [g for g in m.groups() if g is not None][0]
             return line.replace(secret, cls.masking_string)
         else:
@@ -184,13 +255,15 @@ class CTree:
             if node.parent is not None:
                 _ = node.parent.children.pop(node.line)
                 del node
+        if self.parent is not None:
+            self.parent._invalidate_hash()
 
     def __hash__(self) -> int:
         """вычисление hash."""
         # todo тут получается два вида хеша: один только на основе строки конфигурации, и нужен для того
         # todo что бы сделать объект хэшируемым, второй хеш нужен для сравнения на основе как строки, так
         # todo и потомков, что бы при одинаковых хешах у нод не лазить по потомкам. объединить может их?
-        return hash(self.formal_path)
+        return hash(self._formal_path)
 
     # todo добавить сравнение, с учетом порядка команд, как в differ сделано
     def __eq__(self, other: object) -> bool:
@@ -233,14 +306,26 @@ class CTree:
         return all(children_eq)
 
     @property
-    def _formal_path(self) -> list[str]:
-        result = []
-        node = self
-        while node.parent is not None:
-            result.append(node.line)
-            node = node.parent
-        result.reverse()
-        return result
+    def _formal_path(self) -> tuple[str, ...]:
+        # путь строится из закешированного пути родителя, поэтому если путь узла вычислен,
+        # то вычислены и пути всех его предков
+        path = self._path
+        if path is None:
+            if self._parent is None:
+                path = ()
+            else:
+                path = self._parent._formal_path + (self._line,)
+            self._path = path
+        return path
+
+    def _invalidate_path(self) -> None:
+        # сбрасываем путь у узла и потомков, у узла без пути нет путей и у потомков
+        nodes: list[CTree] = [self]
+        while len(nodes) != 0:
+            node = nodes.pop()
+            if node._path is not None:
+                node._path = None
+                nodes.extend(node.children.values())
 
     @property
     def formal_path(self) -> str:
@@ -280,7 +365,7 @@ class CTree:
         return self._build_config(masked=True)
 
     @property
-    def _formal_config(self) -> list[list[str]]:
+    def _formal_config(self) -> list[tuple[str, ...]]:
         result = []
         for node in self.children.values():
             if len(node.children) == 0:
@@ -308,6 +393,8 @@ class CTree:
         nodes = deque(self.children.values())
         result = []
         path_to_root = []
+        without_exit = self.compiled_pattern("sections_without_exit")
+        require_exit = self.compiled_pattern("sections_require_exit")
 
         node = self
         while node.parent is not None:
@@ -321,12 +408,10 @@ class CTree:
             #     continue
             result.append(node.masked_line if masked else node.line)
             if len(node.children) != 0:
-                if not re.fullmatch("|".join(self.sections_without_exit), node.formal_path):
+                if without_exit is None or not without_exit.fullmatch(node.formal_path):
                     nodes.appendleft(self.__class__(line=self.section_exit))
                 nodes.extendleft(list(node.children.values())[::-1])
-            elif len(self.sections_require_exit) != 0 and re.fullmatch(
-                "|".join(self.sections_require_exit), node.formal_path
-            ):
+            elif require_exit is not None and require_exit.fullmatch(node.formal_path):
                 nodes.appendleft(self.__class__(line=self.section_exit))
         result = path_to_root + result + [self.section_exit] * len(path_to_root)
         return "\n".join(result)
@@ -349,6 +434,8 @@ class CTree:
         if children:
             for child in self.children.values():
                 _ = child._copy(children, new_obj)
+            # копия полная, поэтому хеш совпадает с оригиналом (если он уже посчитан)
+            new_obj._node_hash = self._node_hash
         return new_obj
 
     def copy(self, children: bool = True) -> Self:
@@ -357,12 +444,32 @@ class CTree:
             root = root.parent
         return root
 
-    def merge(self, other: Self) -> None:
+    def merge(self, other: Self, *, move: bool = False) -> None:
+        """Слияние other в текущее дерево.
+
+        Args:
+            other (Self): что добавляем
+            move (bool): переносить узлы other, которых нет в дереве, вместо их копирования.
+                Для временных деревьев (копии из поиска, diff), other после этого использовать нельзя.
+        """
+        moved = []
         for line, node in other.children.items():
             if line not in self.children:
-                _ = node._copy(children=True, parent=self)
+                if move:
+                    moved.append(line)
+                else:
+                    _ = node._copy(children=True, parent=self)
             else:
-                self.children[line].merge(node)
+                self.children[line].merge(node, move=move)
+        if len(moved) != 0 and self.children is _NO_CHILDREN:
+            self.children = {}
+        for line in moved:
+            node = other.children[line]
+            self.children[node.line] = node
+            node.parent = self
+            del other.children[line]
+        if len(moved) != 0:
+            self._invalidate_hash()
 
     def _subtract(self, other: Self, masked: bool = False) -> None:
         nodes_to_delete = []
@@ -396,7 +503,6 @@ class CTree:
     def apply(self, other: Self) -> Self:
         result = self.copy()
         result._apply(other=other)
-        result.update_node_hash()
         return result
 
     def rebuild(self, deep: bool = False) -> None:
@@ -405,7 +511,7 @@ class CTree:
         if deep:
             for child in self.children.values():
                 child.rebuild(deep)
-        self.update_node_hash()
+        self._invalidate_hash()
 
     def exists_in(self, other: Self, masked: bool = False) -> str:
         if masked:
@@ -504,12 +610,80 @@ class CTree:
     def pre_run(cls: type, config: str) -> str:
         return config
 
+    @classmethod
+    def pre_run_lines(cls: type, lines: Iterable[str]) -> Iterator[str]:
+        """Построчный вариант pre_run для потокового разбора конфигурации."""
+        return iter(lines)
+
     def post_run(self) -> None:
         return
 
+    def compact(self) -> None:
+        """Уплотнение дерева для долгого хранения в памяти.
+
+        - строки, шаблоны и теги интернируются (sys.intern), поэтому одинаковые строки в разных
+            деревьях хранятся в одном экземпляре
+        - одинаковые списки тегов внутри дерева заменяются одним общим списком (как и список
+            тегов, унаследованный от родителя), поэтому теги уплотненного дерева нельзя менять
+            на месте (tags.append и т.п.), только присваиванием нового списка
+        - у листьев вместо пустого словаря потомков - общий пустой словарь только для чтения,
+            при добавлении потомка через CTree(parent=...) создается обычный словарь
+        - закешированные формальные пути сбрасываются, они вычислятся заново при обращении
+
+        На результат сравнения, сериализации и т.п. не влияет, копии (copy) не уплотняются.
+        """
+        tags_table: dict[tuple[str, ...], list[str]] = {}
+        self._line = sys.intern(self._line)
+        nodes: Deque[CTree] = deque([self])
+        while nodes:
+            node = nodes.pop()
+            node.template = sys.intern(node.template)
+            node.undo_line = sys.intern(node.undo_line)
+            node._path = None
+            key = tuple(sys.intern(tag) for tag in node.tags)
+            tags = tags_table.get(key)
+            if tags is None:
+                tags = tags_table[key] = list(key)
+            node.tags = tags
+            if len(node.children) == 0:
+                node.children = _NO_CHILDREN
+            else:
+                # ключ и строка потомка - один и тот же интернированный объект
+                children = {}
+                for line, child in node.children.items():
+                    line = sys.intern(line)
+                    if child._line == line:
+                        child._line = line
+                    children[line] = child
+                node.children = children
+                nodes.extend(children.values())
+
+    def _invalidate_hash(self) -> None:
+        # если узел уже помечен, то и все его предки помечены, дальше можно не идти
+        node: CTree | None = self
+        while node is not None and len(node._node_hash) != 0:
+            node._node_hash = ""
+            node = node.parent
+
+    @property
+    def node_hash(self) -> str:
+        """Хеш узла с учетом потомков.
+
+        Считается лениво и только для тех узлов, которые изменились после предыдущего
+        вычисления (или еще ни разу не считались).
+        """
+        if len(self._node_hash) == 0:
+            hashes = [node.node_hash for node in self.children.values()]
+            hashes.append(hashlib.sha256(self.line.encode()).hexdigest())
+            # одинаковые поддеревья (в том числе в разных деревьях) хранят одну строку хеша
+            self._node_hash = sys.intern(hashlib.sha256("".join(sorted(hashes)).encode()).hexdigest())
+        return self._node_hash
+
     def update_node_hash(self) -> None:
+        """Принудительный пересчет хеша всего поддерева, предки пересчитаются при обращении."""
         for node in self.children.values():
             node.update_node_hash()
-        hashes = [node.node_hash for node in self.children.values()]
-        hashes.append(hashlib.sha256(self.line.encode()).hexdigest())
-        self.node_hash = hashlib.sha256("".join(sorted(hashes)).encode()).hexdigest()
+        self._node_hash = ""
+        if self.parent is not None:
+            self.parent._invalidate_hash()
+        _ = self.node_hash
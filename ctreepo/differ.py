@@ -1,54 +1,207 @@
+from __future__ import annotations
+
 import re
-from collections import deque
-from typing import Literal
+from bisect import bisect_left
+from collections import Counter
+from typing import Hashable, Iterable, Iterator, Literal, cast
 
 from . import settings
+from .cache import DiffCache
 from .ctree import CTree
+from .metrics import current, stage
 from .models import DiffAction
-from .postproc import _REGISTRY, CTreePostProc
+from .parser import K
+from .postproc import _REGISTRY, CTreePostProc, process_rules
+from .snapshot import CTreeSnapshot
+from .utils import literal_prefix
 
 __all__ = ("CTreeDiffer",)
 
 
+class _AppliedView:
+    """Представление узла base с примененным к нему diff без копирования дерева.
+
+    Аналог base.apply(diff) только для чтения: потомки вычисляются при первом обращении и только
+    для тех узлов, которых касается diff, остальные потомки - узлы base как есть.
+    """
+
+    __slots__ = ("_base", "_diff", "_children")
+
+    # хеш не считаем, пустая строка не совпадает ни с одним хешем, поэтому в такие узлы
+    # сравнение всегда проваливается, как и в узлы с изменениями
+    node_hash = ""
+
+    def __init__(self, base: CTree, diff: CTree) -> None:
+        self._base = base
+        self._diff = diff
+        self._children: dict[str, CTree | _AppliedView] | None = None
+
+    @property
+    def line(self) -> str:
+        return self._base.line
+
+    @property
+    def masked_line(self) -> str:
+        return self._base.masked_line
+
+    @property
+    def children(self) -> dict[str, CTree | _AppliedView]:
+        if self._children is None:
+            # повторяет логику CTree._apply
+            children: dict[str, CTree | _AppliedView] = dict(self._base.children)
+            for child in self._diff.children.values():
+                if child.line.startswith(child.undo):
+                    _ = children.pop(child.line.replace(child.undo, "").strip(), None)
+                elif child.line in children:
+                    children[child.line] = _AppliedView(cast(CTree, children[child.line]), child)
+                else:
+                    children[child.line] = child
+            self._children = children
+        return self._children
+
+
+class _SectionRules:
+    """Классификация секций по ordered_sections/no_diff_sections.
+
+    Паттерны компилируются один раз на вычисление diff, результат проверки запоминается по
+    формальному пути узла, так как оба прохода (удаление и добавление) проверяют одни и те же пути.
+    """
+
+    __slots__ = ("_ordered", "_no_diff", "_memo")
+
+    def __init__(self, ordered_sections: list[str] | None = None, no_diff_sections: list[str] | None = None) -> None:
+        self._ordered = [re.compile(section) for section in ordered_sections or []]
+        if not isinstance(no_diff_sections, list):
+            no_diff_sections = []
+        self._no_diff = [re.compile(section) for section in no_diff_sections]
+        self._memo: dict[str, tuple[bool, bool]] = {}
+
+    def _classify(self, path: str) -> tuple[bool, bool]:
+        result = self._memo.get(path)
+        if result is None:
+            result = (
+                any(section.fullmatch(path) for section in self._ordered),
+                any(section.search(path) for section in self._no_diff),
+            )
+            self._memo[path] = result
+        return result
+
+    def ordered(self, path: str) -> bool:
+        return len(self._ordered) != 0 and self._classify(path)[0]
+
+    def no_diff(self, path: str) -> bool:
+        return len(self._no_diff) != 0 and self._classify(path)[1]
+
+
 class CTreeDiffer:
     @classmethod
-    def _check_ordered(cls, a: CTree, ordered_sections: list[str] | None = None) -> bool:
-        if ordered_sections is not None:
-            for section in ordered_sections:
-                formal_line = " / ".join(a._formal_path)
-                if re.fullmatch(section, formal_line):
-                    return True
-        return False
+    def _exists_in(cls, node: CTree, other: CTree | _AppliedView, masked: bool = False) -> str:
+        # аналог CTree.exists_in, который работает и с _AppliedView
+        if masked:
+            for line, other_node in other.children.items():
+                if node.masked_line == other_node.masked_line:
+                    return line
+            return ""
+        return node.line if node.line in other.children else ""
 
     @classmethod
-    def _check_no_diff(cls, a: CTree, no_diff_sections: list[str] | None = None) -> bool:
-        if not isinstance(no_diff_sections, list) or no_diff_sections is None:
-            return False
-        for section in no_diff_sections:
-            formal_line = " / ".join(a._formal_path)
-            if re.search(section, formal_line):
-                return True
-        return False
+    def _retemplate(cls, node: CTree) -> None:
+        # шаблон по измененной строке узла, как это делает копирование (CTree._copy): если строка
+        # перестала соответствовать шаблону, то шаблон убирается и узел не участвует в удалении по шаблонам
+        if len(node.template) != 0:
+            node.template, _ = node._get_template_undo(node.line, node.template)
 
     @classmethod
-    def _delete_nodes_by_template(cls, root: CTree) -> None:
-        to_delete: set[CTree] = set()
+    def _lcs_lines(cls, a: list[str], b: list[str]) -> set[str]:
+        """Наибольшая общая подпоследовательность строк a и b.
+
+        Строки внутри секции уникальны, поэтому LCS сводится к наибольшей возрастающей
+        подпоследовательности позиций строк a в b, которая ищется за O(n log n).
+        """
+        b_index = {line: indx for indx, line in enumerate(b)}
+        positions = [(b_index[line], line) for line in a if line in b_index]
+        # tails[k] - минимальная позиция, которой заканчивается возрастающая подпоследовательность длины k + 1
+        tails: list[int] = []
+        tails_item: list[int] = []
+        previous = [-1] * len(positions)
+        for item, (position, _) in enumerate(positions):
+            k = bisect_left(tails, position)
+            if k == len(tails):
+                tails.append(position)
+                tails_item.append(item)
+            else:
+                tails[k] = position
+                tails_item[k] = item
+            previous[item] = tails_item[k - 1] if k > 0 else -1
+        result = set()
+        item = tails_item[-1] if len(tails_item) != 0 else -1
+        while item != -1:
+            result.add(positions[item][1])
+            item = previous[item]
+        return result
+
+    @classmethod
+    def _ordered_kept_lines(cls, a: CTree, b: CTree | _AppliedView, fallback_ratio: float | None) -> set[str] | None:
+        # строки секции a, которые остаются на месте при выравнивании по LCS, или None,
+        # если изменений больше fallback_ratio и нужно использовать позиционное сравнение
+        a_lines = list(a.children)
+        b_lines = list(b.children)
+        kept = cls._lcs_lines(a_lines, b_lines)
+        total = len(a_lines) + len(b_lines)
+        if fallback_ratio is not None and total != 0 and (total - 2 * len(kept)) / total > fallback_ratio:
+            return None
+        return kept
+
+    @classmethod
+    def _section_cache_key(
+        cls,
+        a: CTree,
+        b: CTree | _AppliedView,
+        negative: bool,
+        options: tuple[Hashable, ...],
+    ) -> tuple[Hashable, ...]:
+        # ключ всегда в виде (текущая, целевая): при добавлении a - целевая секция, b - текущая
+        # с примененной к ней разницей из прохода удаления, ее хеш тоже входит в ключ
+        if negative:
+            return (a.node_hash, b.node_hash, negative, options)
+        if isinstance(b, _AppliedView):
+            return (b._base.node_hash, a.node_hash, b._diff.node_hash, options)
+        return (b.node_hash, a.node_hash, "", options)
+
+    @classmethod
+    def _delete_nodes_by_template(
+        cls,
+        root: CTree,
+        compiled: dict[str, re.Pattern[str]],
+    ) -> None:
+        # compiled - скомпилированные паттерны, общие на весь проход (и на diff_many), шаблоны у соседей повторяются
+        # у соседей паттерны часто одинаковые (один шаблон), поэтому собираем уникальные
+        patterns: dict[str, None] = {}
         for node in root.children.values():
             if len(node.children) != 0:
-                cls._delete_nodes_by_template(node)
+                cls._delete_nodes_by_template(node, compiled)
             if len(node.template) == 0:
                 continue
-            patterns = []
             if len(node.undo_line) != 0:
-                patterns.append(node.undo_line)
+                patterns[node.undo_line] = None
             if node.line.startswith(f"{node.undo} "):
-                patterns.append(node.template.replace(f"{node.undo} ", "", 1))
+                patterns[node.template.replace(f"{node.undo} ", "", 1)] = None
             else:
-                patterns.append(f"{node.undo} {node.template}")
-            pattern = "|".join(patterns)
-            for n in root.children.values():
-                if re.fullmatch(pattern, n.line):
-                    to_delete.add(n)
+                patterns[f"{node.undo} {node.template}"] = None
+        if len(patterns) == 0:
+            return
+        to_delete: set[CTree] = set()
+        # строки соседей отсортированы, что бы проверять паттерн только на строках с его литеральным префиксом
+        lines = sorted(root.children)
+        for pattern in patterns:
+            if pattern not in compiled:
+                compiled[pattern] = re.compile(pattern)
+            prefix = literal_prefix(pattern)
+            for indx in range(bisect_left(lines, prefix), len(lines)):
+                if not lines[indx].startswith(prefix):
+                    break
+                if compiled[pattern].fullmatch(lines[indx]):
+                    to_delete.add(root.children[lines[indx]])
         for node in to_delete:
             node.delete()
 
@@ -56,22 +209,35 @@ class CTreeDiffer:
     def _diff_list(
         cls,
         a: CTree,  # текущая конфигурация
-        b: CTree,  # целевая
+        b: CTree | _AppliedView,  # целевая
         *,
         existed_diff: CTree | None = None,
-        ordered_sections: list[str] | None = None,
-        no_diff_sections: list[str] | None = None,
+        rules: _SectionRules,
+        path: str = "",  # формальный путь a, передаем вниз, что бы не вычислять для каждого узла
         masked: bool = False,
         negative: bool = False,  # если True, то вычисляем, что нужно удалить, т.е. чего нет в целевой конфигурации
+        ordered_mode: Literal["positional", "lcs"] = "positional",
+        ordered_fallback_ratio: float | None = None,
+        diff_cache: DiffCache | None = None,  # только для верхнего уровня, вниз не передается
+        cache_options: tuple[Hashable, ...] = (),
     ) -> list[CTree]:
         result = []
-        _ordered = cls._check_ordered(a, ordered_sections)
+        _ordered = rules.ordered(path)
         indx = 0
         if existed_diff is not None:
-            b = b.apply(existed_diff)
+            # вместо копии b с примененным diff (b.apply) используем представление поверх b
+            b = _AppliedView(cast(CTree, b), existed_diff)
+        # в режиме lcs удаляем только строки, не вошедшие в общую подпоследовательность, при
+        # добавлении позиционное сравнение с уже очищенной секцией дает ровно недостающие строки
+        kept: set[str] | None = None
+        if _ordered and negative and ordered_mode == "lcs":
+            kept = cls._ordered_kept_lines(a, b, ordered_fallback_ratio)
+        # список строк b для позиционного сравнения строим один раз, а не на каждого потомка
+        b_lines = list(b.children) if _ordered and kept is None else []
         for child in a.children.values():
+            child_path = f"{path} / {child.line}" if len(path) != 0 else child.line
             # для секций, требующих полной перезаписи (без вычисления diff'a)
-            _no_diff = cls._check_no_diff(child, no_diff_sections)
+            _no_diff = rules.no_diff(child_path)
             if _no_diff:
                 # делаем <undo> <section> (если она есть) когда negative=True
                 #! upd: не делаем, потому что будет reordering и <undo> уедет в конец, если
@@ -79,7 +245,7 @@ class CTreeDiffer:
                 #! upd2: не понял, к чему это было и почему проблему вызывает, но без этого
                 #! не работает корректно вычисление разницы
                 if negative:
-                    if not child.exists_in(b):
+                    if not cls._exists_in(child, b):
                         root = child.copy(children=not negative)
                         node = root
                         while len(node.children) == 1:
@@ -88,23 +254,26 @@ class CTreeDiffer:
                             node.line = node.undo_line
                         else:
                             node.line = f"{node.undo} {node.line}"
+                        cls._retemplate(node)
                         root.rebuild(deep=True)
                         result.append(root)
                 # целиком добавляем (negative=False)
                 else:
-                    line = child.exists_in(b)
+                    line = cls._exists_in(child, b)
                     if len(line) == 0 or child != b.children.get(line):
                         root = child.copy(children=True)
                         result.append(root)
                 continue
-            if _ordered:
-                if len(b.children) > indx and child.line == list(b.children.values())[indx].line:
+            if _ordered and kept is not None:
+                line = child.line if child.line in kept else ""
+            elif _ordered:
+                if len(b_lines) > indx and child.line == b_lines[indx]:
                     line = child.line
                     indx += 1
                 else:
                     line = ""
             else:
-                line = child.exists_in(b, masked)
+                line = cls._exists_in(child, b, masked)
             if len(line) == 0:
                 root = child.copy(children=not negative)
                 if negative:
@@ -131,71 +300,221 @@ class CTreeDiffer:
                         #     node.template = f"{node.undo} {node.template}"
                         # else:
                         #     node.template = ""
+                    cls._retemplate(node)
                     root.rebuild(deep=True)
                 result.append(root)
             else:
                 # проваливаемся в рекурсивное сравнение потомков только если
                 # они существуют и (хеши нод разные или секция _ordered)
-                if len(child.children) != 0 and (
-                    child.node_hash != b.children[line].node_hash
-                    or _ordered
-                    # если где-то забыли хеш посчитать
-                    or len(child.node_hash) == 0
-                ):
-                    nested_result = cls._diff_list(
-                        child,
-                        b.children[line],
-                        existed_diff=None,
-                        ordered_sections=ordered_sections,
-                        no_diff_sections=no_diff_sections,
-                        masked=masked,
-                        negative=negative,
-                    )
+                if len(child.children) != 0 and (child.node_hash != b.children[line].node_hash or _ordered):
+                    key = cls._section_cache_key(child, b.children[line], negative, cache_options)
+                    nested_result = diff_cache.get(key) if diff_cache is not None else None
+                    if nested_result is None:
+                        nested_result = cls._diff_list(
+                            child,
+                            b.children[line],
+                            existed_diff=None,
+                            rules=rules,
+                            path=child_path,
+                            masked=masked,
+                            negative=negative,
+                            ordered_mode=ordered_mode,
+                            ordered_fallback_ratio=ordered_fallback_ratio,
+                        )
+                        if diff_cache is not None:
+                            diff_cache.set(key, nested_result)
                     result.extend(nested_result)
         return result
 
     @classmethod
     def diff(
         cls,
-        a: CTree,
-        b: CTree,
+        a: CTree | CTreeSnapshot,
+        b: CTree | CTreeSnapshot,
         *,
         masked: bool = False,
         ordered_sections: list[str] | None = None,
         no_diff_sections: list[str] | None = None,
         reorder_root: bool = True,
         post_proc_rules: list[type[CTreePostProc]] | None = None,
+        ordered_mode: Literal["positional", "lcs"] = "positional",
+        ordered_fallback_ratio: float | None = None,
+        diff_cache: DiffCache | None = None,
+        cache_scope: Hashable = "",
     ) -> CTree:
-        # TODO тут подумать, что бы сразу в нужный parent крепить узел, а не делать merge списка потом
+        """Вычисление разницы между текущей (a) и целевой (b) конфигурациями.
 
-        if a.__class__ != b.__class__:
-            raise RuntimeError("a and b should be instances of the same class")
+        Для секций из ordered_sections порядок строк имеет значение:
+        - positional: строки сравниваются по позициям, все, начиная с первого расхождения,
+            удаляется и добавляется заново в нужном порядке.
+        - lcs: секции выравниваются по наибольшей общей подпоследовательности строк, удаляются
+            и добавляются только строки вне ее. Подходит для секций, где устройство само ставит
+            новую строку на нужное место. Если доля измененных строк секции больше
+            ordered_fallback_ratio, то для нее используется positional.
 
-        root = a.__class__()
+        Если указан diff_cache, то результаты сравнения секций верхнего уровня запоминаются
+        по хешам секций и при повторной встрече той же пары секций берутся из кеша. Хеш не
+        учитывает теги и шаблоны, поэтому если кеш общий для деревьев, разобранных с разными
+        правилами тегов или шаблонами, то их нужно различать через cache_scope (например,
+        дайджест правил и шаблона, как делает CTreeEnv).
 
-        diff_list = cls._diff_list(
+        Вместо деревьев можно передать снимки (CTreeSnapshot), тогда в CTree разворачиваются
+        только секции верхнего уровня, которые могут дать разницу.
+        """
+        rules = _SectionRules(ordered_sections, no_diff_sections)
+        if isinstance(a, CTreeSnapshot) or isinstance(b, CTreeSnapshot):
+            a, b = cls._thaw_changed(a, b, rules, masked)
+        cache_options = cls._cache_options(
+            a,
+            masked,
+            ordered_sections,
+            no_diff_sections,
+            ordered_mode,
+            ordered_fallback_ratio,
+            cache_scope,
+        )
+        return cls._diff(
             a,
             b,
-            existed_diff=None,
-            ordered_sections=ordered_sections,
-            no_diff_sections=no_diff_sections,
+            rules=rules,
+            compiled={},
             masked=masked,
-            negative=True,
+            reorder_root=reorder_root,
+            post_proc_rules=post_proc_rules,
+            ordered_mode=ordered_mode,
+            ordered_fallback_ratio=ordered_fallback_ratio,
+            diff_cache=diff_cache,
+            cache_options=cache_options,
         )
-        for leaf in diff_list:
-            root.merge(leaf)
 
-        diff_list = cls._diff_list(
-            b,
-            a,
-            existed_diff=root,
-            ordered_sections=ordered_sections,
-            no_diff_sections=no_diff_sections,
-            masked=masked,
-            negative=False,
+    @classmethod
+    def _thaw_changed(
+        cls,
+        a: CTree | CTreeSnapshot,
+        b: CTree | CTreeSnapshot,
+        rules: _SectionRules,
+        masked: bool,
+    ) -> tuple[CTree, CTree]:
+        # секции верхнего уровня с одинаковыми строкой и хешем _diff_list пропускает (если они
+        # не ordered и не no_diff), поэтому их не разворачиваем, а остальные - разворачиваем
+        a_sections = cls._top_sections(a)
+        b_sections = cls._top_sections(b)
+        ct_class = a._class if isinstance(a, CTreeSnapshot) else a.__class__
+        skip: set[str] = set()
+        if not rules.ordered(""):
+            # с masked строки сопоставляются по маскированной строке, пропускаем только однозначные
+            a_keys = Counter(ct_class.mask_line(line) if masked else line for line in a_sections)
+            b_keys = Counter(ct_class.mask_line(line) if masked else line for line in b_sections)
+            for line, node_hash in a_sections.items():
+                if b_sections.get(line) != node_hash or rules.ordered(line) or rules.no_diff(line):
+                    continue
+                key = ct_class.mask_line(line) if masked else line
+                if a_keys[key] == 1 and b_keys[key] == 1:
+                    skip.add(line)
+        return cls._thaw_sections(a, a_sections, skip), cls._thaw_sections(b, b_sections, skip)
+
+    @classmethod
+    def _top_sections(cls, ct: CTree | CTreeSnapshot) -> dict[str, str]:
+        # строка -> хеш секций верхнего уровня
+        if isinstance(ct, CTreeSnapshot):
+            return dict(ct.sections())
+        return {line: child.node_hash for line, child in ct.children.items()}
+
+    @classmethod
+    def _thaw_sections(cls, ct: CTree | CTreeSnapshot, sections: dict[str, str], skip: set[str]) -> CTree:
+        if isinstance(ct, CTreeSnapshot):
+            return ct.thaw(line for line in sections if line not in skip)
+        if len(skip) == 0:
+            return ct
+        root = ct.__class__()
+        for line, child in ct.children.items():
+            if line not in skip:
+                _ = child._copy(children=True, parent=root)
+        return root
+
+    @classmethod
+    def _cache_options(
+        cls,
+        a: CTree,
+        masked: bool,
+        ordered_sections: list[str] | None,
+        no_diff_sections: list[str] | None,
+        ordered_mode: Literal["positional", "lcs"],
+        ordered_fallback_ratio: float | None,
+        cache_scope: Hashable,
+    ) -> tuple[Hashable, ...]:
+        # параметры вычисления разницы, входят в ключ DiffCache
+        return (
+            cache_scope,
+            a.__class__.__name__,
+            masked,
+            ordered_mode,
+            ordered_fallback_ratio,
+            tuple(ordered_sections or []),
+            tuple(no_diff_sections) if isinstance(no_diff_sections, list) else (),
         )
-        for leaf in diff_list:
-            root.merge(leaf)
+
+    @classmethod
+    def _diff(
+        cls,
+        a: CTree,
+        b: CTree,
+        *,
+        rules: _SectionRules,
+        compiled: dict[str, re.Pattern[str]],
+        masked: bool,
+        reorder_root: bool,
+        post_proc_rules: list[type[CTreePostProc]] | None,
+        ordered_mode: Literal["positional", "lcs"],
+        ordered_fallback_ratio: float | None,
+        diff_cache: DiffCache | None,
+        cache_options: tuple[Hashable, ...],
+    ) -> CTree:
+        # TODO тут подумать, что бы сразу в нужный parent крепить узел, а не делать merge списка потом
+
+        if a.__class__ != b.__class__:
+            raise RuntimeError("a and b should be instances of the same class")
+
+        root = a.__class__()
+        # результаты _diff_list - свежие копии, их узлы переносим в root без повторного копирования,
+        # кроме случая с кешем, так как из кеша отдаются одни и те же узлы
+        move = diff_cache is None
+        if current() is not None:
+            # хеши считаются лениво при сравнении, при сборе метрик считаем их отдельным этапом
+            with stage("diff.hashing"):
+                _ = a.node_hash, b.node_hash
+
+        with stage("diff.negative"):
+            diff_list = cls._diff_list(
+                a,
+                b,
+                existed_diff=None,
+                rules=rules,
+                masked=masked,
+                negative=True,
+                ordered_mode=ordered_mode,
+                ordered_fallback_ratio=ordered_fallback_ratio,
+                diff_cache=diff_cache,
+                cache_options=cache_options,
+            )
+            for leaf in diff_list:
+                root.merge(leaf, move=move)
+
+        with stage("diff.positive"):
+            diff_list = cls._diff_list(
+                b,
+                a,
+                existed_diff=root,
+                rules=rules,
+                masked=masked,
+                negative=False,
+                ordered_mode=ordered_mode,
+                ordered_fallback_ratio=ordered_fallback_ratio,
+                diff_cache=diff_cache,
+                cache_options=cache_options,
+            )
+            for leaf in diff_list:
+                root.merge(leaf, move=move)
 
         negative = {node.line: node for node in root.children.values() if node.line.startswith(node.undo)}
         for node in negative.values():
@@ -205,72 +524,165 @@ class CTreeDiffer:
             root.children = positive | negative
 
         # пробегаем по diff и удаляем ноды, которые совпадают по шаблонам
-        cls._delete_nodes_by_template(root)
+        with stage("diff.template_dedup"):
+            cls._delete_nodes_by_template(root, compiled)
 
         # пробегаем по post-proc правилам и дорабатываем diff
         if post_proc_rules is None:
             post_proc_rules = _REGISTRY.get(root.vendor) or []
-        for rule in post_proc_rules:
-            rule.process(root)
+        process_rules(root, post_proc_rules)
 
         return root
 
     @classmethod
-    def _human_diff(cls, current: CTree, target: CTree) -> list[CTree]:
-        def _add_node(action: DiffAction, node: CTree) -> None:
-            node_copy = node.copy(action != DiffAction.EXISTS)
-            line = node_copy.line
-            n = node_copy
-            while line != node.line:
-                n = list(n.children.values())[0]
-                line = n.line
-            n.prefix = action
-            result.append(node_copy)
-            if action == DiffAction.EXISTS:
-                return
-            nodes = deque(node_copy.children.values())
-            while nodes:
-                n = nodes.pop()
-                nodes.extendleft(n.children.values())
-                n.prefix = action
-
-        result: list[CTree] = []
+    def diff_many(
+        cls,
+        currents: Iterable[tuple[K, CTree]],
+        target: CTree,
+        *,
+        masked: bool = False,
+        ordered_sections: list[str] | None = None,
+        no_diff_sections: list[str] | None = None,
+        reorder_root: bool = True,
+        post_proc_rules: list[type[CTreePostProc]] | None = None,
+        ordered_mode: Literal["positional", "lcs"] = "positional",
+        ordered_fallback_ratio: float | None = None,
+        diff_cache: DiffCache | None = None,
+        cache_scope: Hashable = "",
+    ) -> Iterator[tuple[K, CTree]]:
+        """Вычисление разницы между множеством текущих конфигураций и одной целевой.
+
+        Например, проверка соответствия парка устройств эталонной конфигурации. Общая часть
+        (классификация секций, хеши целевой конфигурации, скомпилированные шаблоны) готовится
+        один раз, результаты сравнения одинаковых секций переиспользуются через DiffCache
+        (если diff_cache не указан, то создается кеш на время вычисления).
+
+        Args:
+            currents (Iterable[tuple[K, CTree]]): пары (ключ, текущая конфигурация), читаются лениво
+            target (CTree): целевая конфигурация
+            masked (bool): как в diff
+            ordered_sections (list[str] | None): как в diff
+            no_diff_sections (list[str] | None): как в diff
+            reorder_root (bool): как в diff
+            post_proc_rules (list[type[CTreePostProc]] | None): как в diff
+            ordered_mode (Literal["positional", "lcs"]): как в diff
+            ordered_fallback_ratio (float | None): как в diff
+            diff_cache (DiffCache | None): кеш сравнения секций, общий для всех конфигураций
+            cache_scope (Hashable): как в diff
+
+        Yields:
+            tuple[K, CTree]: пары (ключ, разница) в порядке currents
+        """
+        rules = _SectionRules(ordered_sections, no_diff_sections)
+        compiled: dict[str, re.Pattern[str]] = {}
+        if diff_cache is None:
+            diff_cache = DiffCache()
+        cache_options = cls._cache_options(
+            target,
+            masked,
+            ordered_sections,
+            no_diff_sections,
+            ordered_mode,
+            ordered_fallback_ratio,
+            cache_scope,
+        )
+        _ = target.node_hash
+        for key, current_root in currents:
+            diff = cls._diff(
+                current_root,
+                target,
+                rules=rules,
+                compiled=compiled,
+                masked=masked,
+                reorder_root=reorder_root,
+                post_proc_rules=post_proc_rules,
+                ordered_mode=ordered_mode,
+                ordered_fallback_ratio=ordered_fallback_ratio,
+                diff_cache=diff_cache,
+                cache_options=cache_options,
+            )
+            yield key, diff
+
+    @classmethod
+    def _iter_subtree(cls, node: CTree, level: int, action: DiffAction) -> Iterator[tuple[int, DiffAction, str]]:
+        nodes = [(level, node)]
+        while nodes:
+            level, node = nodes.pop()
+            yield level, action, node.line
+            nodes.extend((level + 1, child) for child in reversed(node.children.values()))
+
+    @classmethod
+    def _iter_human_diff(
+        cls,
+        current: CTree,
+        target: CTree,
+        level: int,
+        diff_only: bool,
+    ) -> Iterator[tuple[int, DiffAction, str]]:
+        # удаленные строки идут на своем месте в current, добавленные - перед первой общей
+        # строкой, которая в target идет после них
         indx = 0
+        target_lines = list(target.children)
+        target_index = {line: i for i, line in enumerate(target_lines)}
         for node in current.children.values():
-            if node.line not in target.children:
-                _add_node(DiffAction.DEL, node)
+            target_node = target.children.get(node.line)
+            if target_node is None:
+                yield from cls._iter_subtree(node, level, DiffAction.DEL)
                 continue
 
-            target_indx_node = list(target.children).index(node.line)
-            while indx < target_indx_node:
-                line = list(target.children)[indx]
+            while indx < target_index[node.line]:
+                line = target_lines[indx]
                 if line not in current.children:
-                    _add_node(DiffAction.ADD, target.children[line])
+                    yield from cls._iter_subtree(target.children[line], level, DiffAction.ADD)
                 indx += 1
 
-            # вот тут важно добавлять узел с ' ', что бы потом при merge он не перетирался
-            # узлами с '+'/'-'
-            _add_node(DiffAction.EXISTS, node)
-            result.extend(cls._human_diff(node, target.children[node.line]))
+            # хеш не зависит от порядка потомков, а перестановки в human diff не отображаются,
+            # поэтому одинаковый хеш - в секции нет ни добавленных, ни удаленных строк
+            if node.node_hash == target_node.node_hash:
+                if not diff_only:
+                    yield from cls._iter_subtree(node, level, DiffAction.EXISTS)
+                continue
+            yield level, DiffAction.EXISTS, node.line
+            yield from cls._iter_human_diff(node, target_node, level + 1, diff_only)
 
-        while indx < len(target.children):
-            if list(target.children)[indx] not in current.children:
-                node = list(target.children.values())[indx]
-                _add_node(DiffAction.ADD, node)
+        while indx < len(target_lines):
+            if target_lines[indx] not in current.children:
+                yield from cls._iter_subtree(target.children[target_lines[indx]], level, DiffAction.ADD)
             indx += 1
 
-        return result
-
     @classmethod
-    def _human_diff_remove_existed(cls, root: CTree) -> None:
-        to_delete: set[CTree] = set()
-        for node in root.children.values():
-            if len(node.children) != 0:
-                cls._human_diff_remove_existed(node)
-            if node.prefix == DiffAction.EXISTS and len(node.children) == 0:
-                to_delete.add(node)
-        for node in to_delete:
-            node.delete()
+    def iter_human_diff(
+        cls,
+        current: CTree,
+        target: CTree,
+        mode: Literal["full", "diff-only"] = "diff-only",
+    ) -> Iterator[str]:
+        """Построчный human diff: строки с префиксами "+"/"-"/" " отдаются по мере обхода.
+
+        Текущая и целевая конфигурации обходятся параллельно, копии поддеревьев не создаются,
+        поэтому подходит для отображения разницы больших конфигураций. human_diff - те же
+        строки, собранные в одну.
+
+        Args:
+            current (CTree): текущая конфигурация
+            target (CTree): целевая конфигурация
+            mode (Literal["full", "diff-only"]): full - вся конфигурация, diff-only - только
+                измененные строки и секции, в которых они находятся
+
+        Yields:
+            str: строка human diff
+        """
+        spaces = current.spaces
+        separator = f" {current.section_separator}"
+        started = False
+        for level, action, line in cls._iter_human_diff(current, target, 0, mode == "diff-only"):
+            # после каждой секции верхнего уровня - разделитель
+            if level == 0 and started:
+                yield separator
+            started = True
+            yield f"{action}{spaces * level}{line}"
+        if started:
+            yield separator
 
     @classmethod
     def human_diff(
@@ -279,10 +691,4 @@ class CTreeDiffer:
         target: CTree,
         mode: Literal["full", "diff-only"] = "diff-only",
     ) -> str:
-        root = current.__class__()
-        diff_list = cls._human_diff(current, target)
-        for node in diff_list:
-            root.merge(node)
-        if mode == "diff-only":
-            cls._human_diff_remove_existed(root)
-        return root.config
+        return "\n".join(cls.iter_human_diff(current, target, mode))
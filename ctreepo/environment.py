@@ -1,13 +1,17 @@
+from contextlib import AbstractContextManager
 from pathlib import Path
-from typing import Any, Literal
+from typing import Any, Hashable, Iterable, Iterator, Literal
 
+from .cache import DiffCache, ParseCache
 from .ctree import CTree
 from .differ import CTreeDiffer
-from .models import Vendor
-from .parser import CTreeParser, TaggingRulesDict, TaggingRulesFile
-from .postproc import CTreePostProc
+from .metrics import CTreeMetrics, collect
+from .models import CacheInfo, Vendor
+from .parallel import pool_map
+from .parser import CTreeParser, K, TaggingRulesDict, TaggingRulesFile
+from .postproc import _REGISTRY, CTreePostProc
 from .searcher import CTreeSearcher
-from .serializer import CTreeSerializer
+from .serializer import CTreeRecord, CTreeSerializer
 
 __all__ = ("CTreeEnv",)
 
@@ -22,6 +26,11 @@ class CTreeEnv:
         no_diff_sections: list[str] | None = None,
         post_proc_rules: list[type[CTreePostProc]] | None = None,
         template: str | CTree | None = None,
+        parse_cache: ParseCache | None = None,
+        diff_cache: DiffCache | None = None,
+        ordered_mode: Literal["positional", "lcs"] = "positional",
+        ordered_fallback_ratio: float | None = None,
+        compact: bool = False,
     ):
         if isinstance(tagging_rules, str) or isinstance(tagging_rules, Path):
             _tr_file = TaggingRulesFile(tagging_rules)
@@ -33,10 +42,14 @@ class CTreeEnv:
             _tr_dict = None
 
         self.vendor = vendor
-        self._parser = CTreeParser(vendor=self.vendor, tagging_rules=_tr_file or _tr_dict)
+        self._parser = CTreeParser(vendor=self.vendor, tagging_rules=_tr_file or _tr_dict, compact=compact)
         self._ordered_sections = ordered_sections
         self._no_diff_sections = no_diff_sections
+        self._ordered_mode = ordered_mode
+        self._ordered_fallback_ratio = ordered_fallback_ratio
         self._post_proc_rules = post_proc_rules
+        self._parse_cache = parse_cache
+        self._diff_cache = diff_cache
         self._template: CTree | None
         if isinstance(template, str):
             self._template = self._parser.parse(template)
@@ -45,16 +58,115 @@ class CTreeEnv:
         else:
             self._template = None
 
+    def __getstate__(self) -> dict[str, Any]:
+        # правила пост-обработки фиксируем на момент передачи, что бы в другом процессе
+        # использовались те же правила, даже если они регистрировались динамически
+        if self._post_proc_rules is not None:
+            post_proc_rules = self._post_proc_rules
+        else:
+            post_proc_rules = list(_REGISTRY.get(self.vendor) or [])
+        return {
+            "vendor": self.vendor,
+            "parser": self._parser,
+            "ordered_sections": self._ordered_sections,
+            "no_diff_sections": self._no_diff_sections,
+            "ordered_mode": self._ordered_mode,
+            "ordered_fallback_ratio": self._ordered_fallback_ratio,
+            "post_proc_rules": post_proc_rules,
+            "template": CTreeSerializer.to_records(self._template) if self._template is not None else None,
+            # кеш разницы не передаем, в другом процессе создается свой пустой кеш того же размера
+            "diff_cache_maxsize": self._diff_cache.maxsize if self._diff_cache is not None else None,
+        }
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.vendor = state["vendor"]
+        self._parser = state["parser"]
+        self._ordered_sections = state["ordered_sections"]
+        self._no_diff_sections = state["no_diff_sections"]
+        self._ordered_mode = state["ordered_mode"]
+        self._ordered_fallback_ratio = state["ordered_fallback_ratio"]
+        self._post_proc_rules = state["post_proc_rules"]
+        self._parse_cache = None
+        if state["diff_cache_maxsize"] is not None:
+            self._diff_cache = DiffCache(state["diff_cache_maxsize"])
+        else:
+            self._diff_cache = None
+        if state["template"] is not None:
+            self._template = CTreeSerializer.from_records(self.vendor, state["template"])
+        else:
+            self._template = None
+
     def parse(
         self,
         config: str,
         template: CTree | None = None,
     ) -> CTree:
-        return self._parser.parse(
+        template = template or self._template
+        if self._parse_cache is None:
+            return self._parser.parse(config=config, template=template)
+        key = self._parse_cache.key(
+            vendor=self.vendor,
             config=config,
+            template_digest=template.node_hash if template is not None else "",
+            rules_digest=self._parser.tagging_rules_digest,
+        )
+        records = self._parse_cache.get(key)
+        if records is not None:
+            root = CTreeSerializer.from_records(self.vendor, records)
+            if self._parser.compact:
+                root.compact()
+            return root
+        root = self._parser.parse(config=config, template=template)
+        self._parse_cache.set(key, CTreeSerializer.to_records(root))
+        return root
+
+    def cache_info(self) -> CacheInfo | None:
+        if self._parse_cache is None:
+            return None
+        return self._parse_cache.info()
+
+    def diff_cache_info(self) -> CacheInfo | None:
+        if self._diff_cache is None:
+            return None
+        return self._diff_cache.info()
+
+    def instrument(self, metrics: CTreeMetrics | None = None) -> AbstractContextManager[CTreeMetrics]:
+        """Сбор времени выполнения по этапам разбора, сравнения и пост-обработки.
+
+        with env.instrument() as metrics:
+            diff = env.diff(env.parse(current), env.parse(target))
+        print(metrics.to_dict())
+
+        Args:
+            metrics (CTreeMetrics | None): сборщик, например общий для нескольких устройств
+
+        Returns:
+            AbstractContextManager[CTreeMetrics]: контекстный менеджер, отдает сборщик
+        """
+        return collect(metrics)
+
+    def parse_stream(
+        self,
+        source: Iterable[str] | Path,
+        template: CTree | None = None,
+    ) -> CTree:
+        return self._parser.parse_stream(
+            source=source,
             template=template or self._template,
         )
 
+    def parse_many(
+        self,
+        configs: Iterable[tuple[K, str]],
+        workers: int | None = None,
+        template: CTree | None = None,
+    ) -> Iterator[tuple[K, CTree]]:
+        return self._parser.parse_many(
+            configs=configs,
+            template=template or self._template,
+            workers=workers,
+        )
+
     def diff(
         self,
         a: CTree,
@@ -70,21 +182,94 @@ class CTreeEnv:
             ordered_sections=self._ordered_sections,
             no_diff_sections=self._no_diff_sections,
             post_proc_rules=self._post_proc_rules,
+            ordered_mode=self._ordered_mode,
+            ordered_fallback_ratio=self._ordered_fallback_ratio,
+            diff_cache=self._diff_cache,
+            cache_scope=self._cache_scope(),
+        )
+
+    def _cache_scope(self) -> Hashable:
+        # diff_cache может быть общим для нескольких окружений, а хеш узла не учитывает теги
+        # и шаблоны, поэтому разделяем результаты по правилам тегов и шаблону окружения
+        return (
+            self._parser.tagging_rules_digest,
+            self._template.node_hash if self._template is not None else "",
+        )
+
+    def diff_many(
+        self,
+        pairs: Iterable[tuple[K, str | CTree, str | CTree]],
+        workers: int | None = None,
+        masked: bool = False,
+        reorder_root: bool = True,
+    ) -> Iterator[tuple[K, CTree]]:
+        """Вычисление разницы для множества пар конфигураций в пуле процессов.
+
+        Окружение (правила тегов, шаблон, ordered/no-diff секции, правила пост-обработки)
+        передается в каждый процесс один раз при его запуске. Разбор строковых конфигураций,
+        вычисление разницы и пост-обработка выполняются в процессе пула, результаты
+        возвращаются по мере готовности, одновременно в работе ограниченное число задач.
+
+        Args:
+            pairs (Iterable[tuple[K, str | CTree, str | CTree]]): тройки (ключ, текущая, целевая),
+                конфигурации строкой или уже разобранным деревом
+            workers (int | None): число процессов, по умолчанию - число ядер. При workers=1
+                вычисление выполняется последовательно в текущем процессе.
+            masked (bool): аналогично diff
+            reorder_root (bool): аналогично diff
+
+        Yields:
+            tuple[K, CTree]: пары (ключ, diff) в порядке завершения
+        """
+        if workers == 1:
+            for key, a, b in pairs:
+                yield key, self._diff_pair(a, b, masked, reorder_root)
+            return
+        tasks = ((key, _to_task_config(a), _to_task_config(b)) for key, a, b in pairs)
+        results = pool_map(
+            _diff_many_task,
+            tasks,
+            workers=workers,
+            initializer=_diff_many_init,
+            initargs=(self, masked, reorder_root),
+        )
+        for key, records in results:
+            yield key, CTreeSerializer.from_records(self.vendor, records)
+
+    def _diff_pair(
+        self, a: str | CTree | list[CTreeRecord], b: str | CTree | list[CTreeRecord], masked: bool, reorder_root: bool
+    ) -> CTree:
+        return self.diff(
+            a=self._load(a),
+            b=self._load(b),
+            masked=masked,
+            reorder_root=reorder_root,
         )
 
+    def _load(self, config: str | CTree | list[CTreeRecord]) -> CTree:
+        if isinstance(config, str):
+            return self.parse(config)
+        elif isinstance(config, CTree):
+            return config
+        else:
+            return CTreeSerializer.from_records(self.vendor, config)
+
     def to_dict(
         self,
         ct: CTree,
+        node_hash: bool = False,
     ) -> dict[str, Any]:
-        return CTreeSerializer.to_dict(root=ct)
+        return CTreeSerializer.to_dict(root=ct, node_hash=node_hash)
 
     def from_dict(
         self,
         data: dict[str, Any],
+        trust_hash: bool = False,
     ) -> CTree:
         return CTreeSerializer.from_dict(
             vendor=self.vendor,
             data=data,
+            trust_hash=trust_hash,
         )
 
     def search(
@@ -105,3 +290,27 @@ class CTreeEnv:
             exclude_tags=exclude_tags,
             include_children=include_children,
         )
+
+
+def _to_task_config(config: str | CTree) -> str | list[CTreeRecord]:
+    # деревья передаем в процесс пула записями, а не графом объектов
+    if isinstance(config, CTree):
+        return CTreeSerializer.to_records(config)
+    return config
+
+
+# состояние процесса пула для diff_many: окружение и параметры diff, создаются один раз на процесс
+_worker_state: tuple[CTreeEnv, bool, bool] | None = None
+
+
+def _diff_many_init(env: CTreeEnv, masked: bool, reorder_root: bool) -> None:
+    global _worker_state
+    _worker_state = (env, masked, reorder_root)
+
+
+def _diff_many_task(item: tuple[K, str | list[CTreeRecord], str | list[CTreeRecord]]) -> tuple[K, list[CTreeRecord]]:
+    if _worker_state is None:
+        raise RuntimeError("worker is not initialized")
+    env, masked, reorder_root = _worker_state
+    key, a, b = item
+    return key, CTreeSerializer.to_records(env._diff_pair(a, b, masked, reorder_root))
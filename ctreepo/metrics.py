@@ -0,0 +1,85 @@
+import time
+from contextlib import AbstractContextManager, contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Iterator
+
+__all__ = (
+    "CTreeMetrics",
+    "collect",
+    "current",
+    "stage",
+)
+
+
+class CTreeMetrics:
+    """Время выполнения и число вызовов по этапам разбора, сравнения и пост-обработки.
+
+    Этапы:
+    - parse.pre_run, parse.lines, parse.template, parse.tagging, parse.post_run - разбор конфигурации,
+        для parse.lines/parse.template/parse.tagging счетчик - число обработанных строк
+    - diff.hashing, diff.negative, diff.positive, diff.template_dedup - вычисление разницы
+    - postproc.<имя класса правила> - правила пост-обработки (только вызванные)
+    """
+
+    __slots__ = ("_time", "_count")
+
+    def __init__(self) -> None:
+        self._time: dict[str, float] = {}
+        self._count: dict[str, int] = {}
+
+    def add(self, name: str, seconds: float, count: int = 1) -> None:
+        self._time[name] = self._time.get(name, 0.0) + seconds
+        self._count[name] = self._count.get(name, 0) + count
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def to_dict(self) -> dict[str, dict[str, float | int]]:
+        return {name: {"time": seconds, "count": self._count[name]} for name, seconds in self._time.items()}
+
+    def clear(self) -> None:
+        self._time.clear()
+        self._count.clear()
+
+
+_CURRENT: ContextVar[CTreeMetrics | None] = ContextVar("ctreepo_metrics", default=None)
+
+
+def current() -> CTreeMetrics | None:
+    """Активный сборщик метрик или None, если сбор не включен."""
+    return _CURRENT.get()
+
+
+def stage(name: str) -> AbstractContextManager[None]:
+    """Замер этапа в активный сборщик, без сборщика ничего не делает."""
+    metrics = _CURRENT.get()
+    if metrics is None:
+        return nullcontext()
+    return metrics.stage(name)
+
+
+@contextmanager
+def collect(metrics: CTreeMetrics | None = None) -> Iterator[CTreeMetrics]:
+    """Включение сбора метрик для кода внутри блока with.
+
+    Сборщик хранится в contextvar, поэтому потоки и asyncio-задачи собирают метрики независимо.
+    В процессы пула (parse_many/diff_many с workers != 1) сборщик не передается.
+
+    Args:
+        metrics (CTreeMetrics | None): сборщик, по умолчанию создается новый
+
+    Yields:
+        CTreeMetrics: сборщик с накопленными метриками
+    """
+    if metrics is None:
+        metrics = CTreeMetrics()
+    token = _CURRENT.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _CURRENT.reset(token)
@@ -2,6 +2,7 @@ from dataclasses import dataclass
 from enum import StrEnum, auto
 
 __all__ = (
+    "CacheInfo",
     "TaggingRule",
     "Vendor",
     "DiffAction",
@@ -21,6 +22,16 @@ class TaggingRule:
     tags: list[str]
 
 
+@dataclass(frozen=True, slots=True)
+class CacheInfo:
+    # статистика кеша (ParseCache, DiffCache)
+    hits: int  # найдено в памяти
+    disk_hits: int  # найдено на диске
+    misses: int  # не найдено, результат вычислен заново
+    size: int  # сколько записей сейчас в памяти
+    maxsize: int  # максимальное число записей в памяти
+
+
 class Vendor(StrEnum):
     ARISTA = auto()
     CISCO = auto()
@@ -0,0 +1,53 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Any, Callable, Iterable, Iterator, TypeVar
+
+__all__ = ("pool_map",)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def pool_map(
+    func: Callable[[T], R],
+    items: Iterable[T],
+    *,
+    workers: int | None = None,
+    initializer: Callable[..., None] | None = None,
+    initargs: tuple[Any, ...] = (),
+    max_pending: int | None = None,
+) -> Iterator[R]:
+    """Выполнение func над items в пуле процессов, результаты отдаются по мере готовности.
+
+    Задачи отправляются в пул порциями: одновременно в работе не больше max_pending задач,
+    поэтому ни входные данные, ни результаты не накапливаются в памяти целиком.
+
+    Args:
+        func (Callable[[T], R]): функция уровня модуля, выполняется в процессе пула
+        items (Iterable[T]): входные данные, читаются лениво
+        workers (int | None): число процессов, по умолчанию - число ядер
+        initializer (Callable[..., None] | None): инициализация процесса, вызывается один раз на процесс
+        initargs (tuple[Any, ...]): аргументы для initializer
+        max_pending (int | None): сколько задач держать в работе, по умолчанию - workers * 4
+
+    Yields:
+        R: результаты в порядке завершения задач
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or workers * 4
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs)
+    pending: set[Future[R]] = set()
+    try:
+        for item in items:
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            pending.add(pool.submit(func, item))
+        while len(pending) != 0:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    finally:
+        # при досрочном выходе (break, исключение) задачи, которые еще не начались, отменяем
+        pool.shutdown(wait=True, cancel_futures=True)
@@ -1,15 +1,22 @@
 from __future__ import annotations
 
 import abc
+import hashlib
 import re
+import time
 from pathlib import Path
+from typing import Any, Hashable, Iterable, Iterator, TypeVar
 
 import yaml
 
 from . import settings
 from .ctree import CTree
 from .factory import ctree_class
+from .metrics import current, stage
 from .models import TaggingRule, Vendor
+from .parallel import pool_map
+from .serializer import CTreeRecord, CTreeSerializer
+from .utils import literal_prefix
 
 __all__ = (
     "CTreeParser",
@@ -18,6 +25,8 @@ __all__ = (
     "TaggingRulesDict",
 )
 
+K = TypeVar("K", bound=Hashable)
+
 
 class TaggingRules(abc.ABC):
     @property
@@ -96,39 +105,156 @@ class TaggingRulesDict(TaggingRules):
         self.rules = result
 
 
+class _TemplateIndex:
+    """Индекс потомков узла шаблона для поиска шаблона, подходящего под строку конфигурации.
+
+    Шаблоны с литеральным первым словом раскладываются по корзинам с ключом по этому слову,
+    остальные (начинаются с regex) проверяются для любой строки. Порядок проверки шаблонов
+    внутри корзины совпадает с порядком в дереве шаблона, поэтому находится тот же шаблон,
+    что и при полном переборе.
+    """
+
+    __slots__ = ("_buckets", "_fallback", "_children")
+
+    def __init__(self, template: CTree | None = None) -> None:
+        buckets: dict[str, list[tuple[int, re.Pattern[str], CTree]]] = {}
+        fallback: list[tuple[int, re.Pattern[str], CTree]] = []
+        children = template.children.values() if template is not None else []
+        for indx, node in enumerate(children):
+            pattern = node.line.split(settings.TEMPLATE_SEPARATOR)[0].strip()
+            entry = (indx, re.compile(pattern), node)
+            prefix = literal_prefix(pattern)
+            # первое слово гарантированно литеральное, если за ним в префиксе идет пробел
+            # или весь паттерн целиком литеральный
+            if " " in prefix or (len(prefix) != 0 and prefix == pattern):
+                buckets.setdefault(prefix.split(" ", 1)[0], []).append(entry)
+            else:
+                fallback.append(entry)
+        self._buckets = {
+            token: [(p, n) for _, p, n in sorted(entries + fallback, key=lambda e: e[0])]
+            for token, entries in buckets.items()
+        }
+        self._fallback = [(p, n) for _, p, n in fallback]
+        self._children: dict[int, _TemplateIndex] = {}
+
+    def get(self, line: str) -> CTree | None:
+        for pattern, node in self._buckets.get(line.split(" ", 1)[0], self._fallback):
+            if pattern.fullmatch(line) is not None:
+                return node
+        return None
+
+    def child(self, template: CTree | None) -> "_TemplateIndex":
+        if template is None:
+            return _EMPTY_TEMPLATE_INDEX
+        index = self._children.get(id(template))
+        if index is None:
+            index = _TemplateIndex(template)
+            self._children[id(template)] = index
+        return index
+
+
+_EMPTY_TEMPLATE_INDEX = _TemplateIndex()
+
+
+class _TaggingMatcher:
+    """Скомпилированные правила расстановки тегов.
+
+    Правила вида "^<слово> ..." раскладываются по корзинам с ключом по этому слову, остальные
+    проверяются для любого пути. Внутри корзины правила идут в исходном порядке, поэтому
+    срабатывает то же (первое подходящее) правило, что и при полном переборе.
+    """
+
+    __slots__ = ("_buckets", "_fallback")
+
+    def __init__(self, rules: list[TaggingRule]) -> None:
+        buckets: dict[str, list[tuple[int, re.Pattern[str], list[str]]]] = {}
+        fallback: list[tuple[int, re.Pattern[str], list[str]]] = []
+        for indx, rule in enumerate(rules):
+            entry = (indx, re.compile(rule.regex), rule.tags)
+            prefix = literal_prefix(rule.regex[1:]) if rule.regex.startswith("^") else ""
+            if " " in prefix:
+                buckets.setdefault(prefix.split(" ", 1)[0], []).append(entry)
+            else:
+                fallback.append(entry)
+        self._buckets = {
+            token: [(p, t) for _, p, t in sorted(entries + fallback, key=lambda e: e[0])]
+            for token, entries in buckets.items()
+        }
+        self._fallback = [(p, t) for _, p, t in fallback]
+
+    def match(self, path: str) -> list[str] | None:
+        for pattern, tags in self._buckets.get(path.split(" ", 1)[0], self._fallback):
+            if m := pattern.search(path):
+                return [*tags, *m.groups()]
+        return None
+
+
 class CTreeParser:
-    def __init__(self, vendor: Vendor, tagging_rules: TaggingRules | None = None) -> None:
+    def __init__(self, vendor: Vendor, tagging_rules: TaggingRules | None = None, compact: bool = False) -> None:
+        self.vendor = vendor
+        # уплотнять разобранные деревья (CTree.compact)
+        self.compact = compact
         self._class = ctree_class(vendor)
         if tagging_rules is None:
             self.tagging_rules = []
         else:
             self.tagging_rules = tagging_rules.rules.get(vendor, [])
+        # индекс последнего использованного шаблона: (шаблон, хеш шаблона, индекс)
+        self._template_index: tuple[CTree, str, _TemplateIndex] | None = None
+
+    def __getstate__(self) -> dict[str, Any]:
+        # кеши (индекс шаблона, скомпилированные правила) не передаем, они собираются заново
+        return {"vendor": self.vendor, "tagging_rules": self.tagging_rules, "compact": self.compact}
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__init__(state["vendor"], compact=state["compact"])  # type: ignore[misc]
+        self.tagging_rules = state["tagging_rules"]
+
+    def _get_template_index(self, template: CTree) -> _TemplateIndex:
+        if len(template.children) == 0:
+            return _EMPTY_TEMPLATE_INDEX
+        # индекс строится один раз на шаблон и перестраивается, если шаблон изменился
+        cached = self._template_index
+        if cached is not None and cached[0] is template and cached[1] == template.node_hash:
+            return cached[2]
+        index = _TemplateIndex(template)
+        self._template_index = (template, template.node_hash, index)
+        return index
 
-    def _get_template(self, line: str, template_list: list[CTree]) -> CTree:
-        for template in template_list:
-            pattern = template.line.split(settings.TEMPLATE_SEPARATOR)[0].strip()
-            if re.fullmatch(pattern, line) is not None:
-                return template
-        return self._class()
-
-    def _get_tags(self, line: str) -> list[str] | None:
-        for rule in self.tagging_rules:
-            if m := re.search(rule.regex, line):
-                return [*rule.tags, *m.groups()]
-        return None
+    @property
+    def tagging_rules(self) -> list[TaggingRule]:
+        return self._tagging_rules
+
+    @tagging_rules.setter
+    def tagging_rules(self, rules: list[TaggingRule]) -> None:
+        self._tagging_rules = rules
+        self._tagging = _TaggingMatcher(rules)
+        # отпечаток правил, используется в ключе кеша разобранных конфигураций
+        self.tagging_rules_digest = hashlib.sha256(repr([(r.regex, r.tags) for r in rules]).encode()).hexdigest()
 
-    def _parse(self, ct: type[CTree], config: str, template_tree: CTree) -> CTree:
+    def _parse(self, ct: type[CTree], lines: Iterable[str], template_tree: CTree) -> CTree:
         root = ct()
         section = [root]
-        template_stack = [list(template_tree.children.values())]
+        template_stack = [self._get_template_index(template_tree)]
         spaces = [0]
         previous_node: CTree = root
-
-        for line in config.splitlines():
+        previous_template: CTree | None = None
+        # формальные пути секций, что бы не собирать путь до корня для каждой строки
+        paths = [""]
+        previous_path = ""
+        tagging = len(self.tagging_rules) != 0
+        skip_pattern = ct.compiled_pattern("junk_lines")
+        # время поиска шаблонов и тегов считаем только при включенном сборе метрик
+        metrics = current()
+        template_time = 0.0
+        tagging_time = 0.0
+        lines_count = 0
+        start = time.perf_counter()
+
+        for line in lines:
             if len(line.strip()) == 0:
                 continue
-            skip_pattern = "|".join(ct.junk_lines)  # type: ignore[arg-type]
-            if re.fullmatch(skip_pattern, line):
+            if skip_pattern is not None and skip_pattern.fullmatch(line):
                 continue
 
             # число пробелов у текущей строки
@@ -138,40 +264,158 @@ class CTreeParser:
             # мы вошли в секцию
             if current_space > spaces[-1]:
                 section.append(previous_node)
+                paths.append(previous_path)
                 spaces.append(current_space)
-                previous_template = self._get_template(previous_node.line, template_stack[-1])
-                template_stack.append(list(previous_template.children.values()))
+                template_stack.append(template_stack[-1].child(previous_template))
             # мы вышли из секции
             elif current_space < spaces[-1]:
                 while current_space != spaces[-1]:
                     _ = section.pop()
+                    _ = paths.pop()
                     _ = spaces.pop()
                     _ = template_stack.pop()
 
-            template = self._get_template(line, template_stack[-1])
+            if metrics is None:
+                template = template_stack[-1].get(line)
+            else:
+                lines_count += 1
+                started = time.perf_counter()
+                template = template_stack[-1].get(line)
+                template_time += time.perf_counter() - started
+            previous_template = template
 
             parent = section[-1]
-            if len(self.tagging_rules) != 0:
-                full_line = parent._formal_path
-                full_line.append(line)
-                tags = self._get_tags(" / ".join(full_line))
+            if tagging:
+                previous_path = f"{paths[-1]} / {line}" if len(paths[-1]) != 0 else line
+                if metrics is None:
+                    tags = self._tagging.match(previous_path)
+                else:
+                    started = time.perf_counter()
+                    tags = self._tagging.match(previous_path)
+                    tagging_time += time.perf_counter() - started
             else:
                 tags = None
 
             if line in parent.children:
                 previous_node = parent.children[line]
             else:
-                previous_node = ct(line=line, parent=parent, tags=tags, template=template.line)
-
+                previous_node = ct(
+                    line=line,
+                    parent=parent,
+                    tags=tags,
+                    template=template.line if template is not None else "",
+                )
+
+        if metrics is not None:
+            metrics.add("parse.lines", time.perf_counter() - start, lines_count)
+            metrics.add("parse.template", template_time, lines_count)
+            if tagging:
+                metrics.add("parse.tagging", tagging_time, lines_count)
         return root
 
     def parse(self, config: str, template: CTree | None = None) -> CTree:
         if template is None:
             template = self._class()
-        config = self._class.pre_run(config)
-        root = self._parse(self._class, config, template)
-        root.post_run()
-        root.update_node_hash()
+        with stage("parse.pre_run"):
+            config = self._class.pre_run(config)
+        root = self._parse(self._class, config.splitlines(), template)
+        with stage("parse.post_run"):
+            root.post_run()
+        if self.compact:
+            root.compact()
         # тут уже CTree, cast не нужен, но для истории оставлю
         # root = cast(CTree, root)
         return root
+
+    def parse_stream(self, source: Iterable[str] | Path, template: CTree | None = None) -> CTree:
+        """Потоковый разбор конфигурации.
+
+        Конфигурация читается построчно из файла (Path), открытого файлового объекта или любого
+        итератора строк, предварительная обработка (pre_run_lines) тоже построчная, поэтому в
+        памяти не держится текст конфигурации целиком.
+
+        Args:
+            source (Iterable[str] | Path): путь к файлу, файловый объект или итератор строк
+            template (CTree | None): шаблон конфигурации
+
+        Returns:
+            CTree: дерево конфигурации
+        """
+        if isinstance(source, str):
+            raise TypeError("source should be a Path or an iterable of lines, use parse() for a string config")
+        if template is None:
+            template = self._class()
+        if isinstance(source, Path):
+            with open(source, "r") as f:
+                root = self._parse_lines(f, template)
+        else:
+            root = self._parse_lines(source, template)
+        with stage("parse.post_run"):
+            root.post_run()
+        if self.compact:
+            root.compact()
+        return root
+
+    def _parse_lines(self, source: Iterable[str], template: CTree) -> CTree:
+        lines = (line.rstrip("\r\n") for line in source)
+        return self._parse(self._class, self._class.pre_run_lines(lines), template)
+
+    def parse_many(
+        self,
+        configs: Iterable[tuple[K, str]],
+        template: CTree | None = None,
+        workers: int | None = None,
+    ) -> Iterator[tuple[K, CTree]]:
+        """Разбор множества конфигураций в пуле процессов.
+
+        Парсер (правила тегов) и шаблон передаются в каждый процесс один раз при его запуске,
+        конфигурации читаются из configs лениво, а результаты возвращаются по мере готовности,
+        поэтому в памяти не держится весь набор устройств сразу. Из процесса дерево возвращается
+        в компактном виде (CTreeSerializer.to_records), а не графом объектов.
+
+        Args:
+            configs (Iterable[tuple[K, str]]): пары (ключ, конфигурация), ключ - например, имя устройства
+            template (CTree | None): шаблон конфигурации
+            workers (int | None): число процессов, по умолчанию - число ядер. При workers=1
+                разбор выполняется последовательно в текущем процессе.
+
+        Yields:
+            tuple[K, CTree]: пары (ключ, дерево) в порядке завершения разбора
+        """
+        if template is None:
+            template = self._class()
+        if workers == 1:
+            for key, config in configs:
+                yield key, self.parse(config, template)
+            return
+        results = pool_map(
+            _parse_many_task,
+            configs,
+            workers=workers,
+            initializer=_parse_many_init,
+            initargs=(self.vendor, self.tagging_rules, CTreeSerializer.to_records(template)),
+        )
+        for key, records in results:
+            root = CTreeSerializer.from_records(self.vendor, records)
+            if self.compact:
+                root.compact()
+            yield key, root
+
+
+# состояние процесса пула для parse_many: парсер и шаблон создаются один раз на процесс
+_worker_state: tuple[CTreeParser, CTree] | None = None
+
+
+def _parse_many_init(vendor: Vendor, tagging_rules: list[TaggingRule], template: list[CTreeRecord]) -> None:
+    global _worker_state
+    parser = CTreeParser(vendor)
+    parser.tagging_rules = tagging_rules
+    _worker_state = (parser, CTreeSerializer.from_records(vendor, template))
+
+
+def _parse_many_task(item: tuple[K, str]) -> tuple[K, list[CTreeRecord]]:
+    if _worker_state is None:
+        raise RuntimeError("worker is not initialized")
+    parser, template = _worker_state
+    key, config = item
+    return key, CTreeSerializer.to_records(parser.parse(config, template))
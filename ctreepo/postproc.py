@@ -1,17 +1,27 @@
 import abc
+import re
+from bisect import bisect_left
 from typing import Any, Callable
 
 from .ctree import CTree
+from .metrics import stage
 from .models import Vendor
+from .utils import literal_prefix
 
 __all__ = (
     "register_rule",
+    "process_rules",
     "CTreePostProc",
     "_REGISTRY",
 )
 
 
 class CTreePostProc(abc.ABC):
+    # секции верхнего уровня, с которыми работает правило: префикс строки (str) или regex (re.Pattern,
+    # проверяется через match). Если ни одной такой секции в diff нет, то правило не вызывается.
+    # Пустой кортеж - правило вызывается всегда
+    sections: tuple[str | re.Pattern[str], ...] = ()
+
     @classmethod
     @abc.abstractmethod
     def process(cls, ct: CTree) -> None:
@@ -28,3 +38,43 @@ def register_rule(vendor: Vendor) -> Callable[[type[CTreePostProc]], Any]:
         return cls
 
     return wrapper
+
+
+def _has_section(index: list[str], sections: tuple[str | re.Pattern[str], ...]) -> bool:
+    # index - отсортированные строки верхнего уровня, проверяем только строки с нужным префиксом
+    for section in sections:
+        if isinstance(section, str):
+            prefix, pattern = section, None
+        else:
+            prefix = literal_prefix(section.pattern) if not section.flags & re.IGNORECASE else ""
+            pattern = section
+        for indx in range(bisect_left(index, prefix), len(index)):
+            if not index[indx].startswith(prefix):
+                break
+            if pattern is None or pattern.match(index[indx]):
+                return True
+    return False
+
+
+def process_rules(ct: CTree, rules: list[type[CTreePostProc]]) -> None:
+    """Последовательное применение правил пост-обработки к diff.
+
+    Строки верхнего уровня индексируются один раз, правила с объявленными секциями (sections)
+    вызываются только если такие секции есть в diff. Если правило изменило набор строк верхнего
+    уровня, то индекс перестраивается.
+
+    Args:
+        ct (CTree): diff, изменяется на месте
+        rules (list[type[CTreePostProc]]): правила в порядке применения
+    """
+    lines = [node.line for node in ct.children.values()]
+    index = sorted(lines)
+    for rule in rules:
+        if len(rule.sections) != 0 and not _has_section(index, rule.sections):
+            continue
+        with stage(f"postproc.{rule.__name__}"):
+            rule.process(ct)
+        current = [node.line for node in ct.children.values()]
+        if current != lines:
+            lines = current
+            index = sorted(current)
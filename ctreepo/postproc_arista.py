@@ -15,6 +15,12 @@ __all__ = (
 
 @register_rule(Vendor.ARISTA)
 class AristaPostProcAAA(CTreePostProc):
+    sections = (
+        "aaa authentication login default",
+        "aaa authentication login console",
+        "aaa authentication enable default",
+    )
+
     @classmethod
     def process(cls, ct: CTree) -> None:
         lines_to_check = (
@@ -35,6 +41,8 @@ class AristaPostProcAAA(CTreePostProc):
 
 @register_rule(Vendor.ARISTA)
 class AristaPostProcBGP(CTreePostProc):
+    sections = ("router bgp ",)
+
     @classmethod
     def process(cls, ct: CTree) -> None:
         def _delete_nodes(ct: CTree) -> None:
@@ -74,6 +82,8 @@ class AristaPostProcBGP(CTreePostProc):
 
 @register_rule(Vendor.ARISTA)
 class AristaPostProcEnable(CTreePostProc):
+    sections = ("enable password",)
+
     @classmethod
     def process(cls, ct: CTree) -> None:
         nodes_to_delete: set[CTree] = set()
@@ -89,6 +99,8 @@ class AristaPostProcEnable(CTreePostProc):
 
 @register_rule(Vendor.ARISTA)
 class AristaPostProcPrefixList(CTreePostProc):
+    sections = ("ip prefix-list ", "no ip prefix-list ")
+
     @classmethod
     def process(cls, ct: CTree) -> None:
         pl_statements: dict[str, list[str]] = {}
@@ -130,6 +142,8 @@ class AristaPostProcPrefixList(CTreePostProc):
 
 @register_rule(Vendor.ARISTA)
 class AristaPostProcTacacsKey(CTreePostProc):
+    sections = ("tacacs-server key",)
+
     @classmethod
     def process(cls, ct: CTree) -> None:
         # если строка без пароля то удаляем этот и undo узлы
@@ -149,6 +163,8 @@ class AristaPostProcTacacsKey(CTreePostProc):
 
 @register_rule(Vendor.ARISTA)
 class AristaPostProcUsers(CTreePostProc):
+    sections = ("username ",)
+
     @classmethod
     def process(cls, ct: CTree) -> None:
         lines_to_delete = []
@@ -191,6 +207,8 @@ class AristaPostProcUsers(CTreePostProc):
 
 @register_rule(Vendor.ARISTA)
 class HuaweiPostProcInterface(CTreePostProc):
+    sections = ("interface ",)
+
     @classmethod
     def _process_interface(cls, ct: CTree) -> None:
         secondary_ips: list[CTree] = []
@@ -215,6 +233,8 @@ class HuaweiPostProcInterface(CTreePostProc):
 
 @register_rule(Vendor.ARISTA)
 class AristaPostProcSNMP(CTreePostProc):
+    sections = ("no snmp-server ", "snmp-server ")
+
     @classmethod
     def process(cls, ct: CTree) -> None:
         nodes_to_delete: set[CTree] = set()
@@ -7,6 +7,8 @@ __all__ = ("CiscoPostProcBGP",)
 
 @register_rule(Vendor.CISCO)
 class CiscoPostProcBGP(CTreePostProc):
+    sections = ("router bgp ",)
+
     @classmethod
     def _delete_nodes(cls, ct: CTree, lines_to_delete: set[str]) -> None:
         nodes_to_delete: list[CTree] = []
@@ -99,6 +99,8 @@ class DeleteNoValue(CTreePostProc):
 
 @register_rule(Vendor.HUAWEI)
 class HuaweiPostProcAAA(CTreePostProc):
+    sections = ("aaa",)
+
     @classmethod
     def process(cls, ct: CTree) -> None:
         """Пост-обработка секции aaa.
@@ -179,6 +181,8 @@ class HuaweiPostProcAAA(CTreePostProc):
 
 @register_rule(Vendor.HUAWEI)
 class HuaweiPostProcBGP(CTreePostProc):
+    sections = ("bgp",)
+
     @classmethod
     def _process_af(cls, ct: CTree) -> None:
         to_delete: set[CTree] = set()
@@ -209,6 +213,8 @@ class HuaweiPostProcBGP(CTreePostProc):
 #!должно быть выше интерфейсов
 @register_rule(Vendor.HUAWEI)
 class HuaweiPostProcBridgeDomain(CTreePostProc):
+    sections = ("bridge-domain ",)
+
     @classmethod
     def _process_bd(cls, ct: CTree) -> None:
         bd_id = ct.line.split()[-1]
@@ -259,6 +265,8 @@ class HuaweiPostProcBridgeDomain(CTreePostProc):
 
 @register_rule(Vendor.HUAWEI)
 class HuaweiPostProcInterfaceChangeLinkType(CTreePostProc):
+    sections = ("interface ",)
+
     @classmethod
     def _undo_link_type(cls, ct: CTree, link_type: str) -> None:
         to_delete: set[CTree] = set()
@@ -330,6 +338,8 @@ class HuaweiPostProcInterfaceChangeLinkType(CTreePostProc):
 
 @register_rule(Vendor.HUAWEI)
 class HuaweiPostProcInterfaceUnrangeVlans(CTreePostProc):
+    sections = ("interface ",)
+
     @classmethod
     def _process(cls, ct: CTree) -> None:
         old_allowed_node: CTree | None = None
@@ -372,6 +382,8 @@ class HuaweiPostProcInterfaceUnrangeVlans(CTreePostProc):
 
 @register_rule(Vendor.HUAWEI)
 class HuaweiPostProcInterfaceQoSdrr(CTreePostProc):
+    sections = ("interface ",)
+
     @classmethod
     def _process(cls, ct: CTree) -> None:
         to_delete: set[CTree] = set()
@@ -393,6 +405,8 @@ class HuaweiPostProcInterfaceQoSdrr(CTreePostProc):
 
 @register_rule(Vendor.HUAWEI)
 class HuaweiPostProcInterface(CTreePostProc):
+    sections = ("interface ", "undo interface ")
+
     @classmethod
     def _process_interface(cls, ct: CTree) -> None:
         # меняем или нет режим порта l2/l3 (portswitch/undo portswitch), если да, то нужно порядок менять
@@ -487,6 +501,8 @@ class HuaweiPostProcInterface(CTreePostProc):
 
 @register_rule(Vendor.HUAWEI)
 class HuaweiPostProcPrefixList(CTreePostProc):
+    sections = ("ip ip-prefix ", "undo ip ip-prefix ")
+
     @classmethod
     def process(cls, ct: CTree) -> None:
         pl_statements: dict[str, list[str]] = {}
@@ -511,6 +527,8 @@ class HuaweiPostProcPrefixList(CTreePostProc):
 
 @register_rule(Vendor.HUAWEI)
 class HuaweiPostProcRoutePolicy(CTreePostProc):
+    sections = ("undo route-policy ",)
+
     @classmethod
     def process(cls, ct: CTree) -> None:
         for child in ct.children.values():
@@ -522,6 +540,8 @@ class HuaweiPostProcRoutePolicy(CTreePostProc):
 
 @register_rule(Vendor.HUAWEI)
 class HuaweiPostProcRadius(CTreePostProc):
+    sections = ("radius-server template ",)
+
     @classmethod
     def _process_radius_section(cls, radius: CTree) -> None:
         to_delete: set[CTree] = set()
@@ -555,6 +575,8 @@ class HuaweiPostProcRadius(CTreePostProc):
 
 @register_rule(Vendor.HUAWEI)
 class HuaweiPostProcTacacs(CTreePostProc):
+    sections = ("hwtacacs-server template", "hwtacacs server template")
+
     @classmethod
     def process(cls, ct: CTree) -> None:
         filtered_tacacs = [
@@ -608,6 +630,8 @@ class HuaweiPostProcTacacs(CTreePostProc):
 
 @register_rule(Vendor.HUAWEI)
 class HuaweiPostProcSNMP(CTreePostProc):
+    sections = ("undo snmp-agent", "snmp-agent")
+
     @classmethod
     def process(cls, ct: CTree) -> None:
         nodes_to_delete: set[CTree] = set()
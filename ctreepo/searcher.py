@@ -2,22 +2,23 @@ import re
 from typing import Literal
 
 from .ctree import CTree
+from .snapshot import CTreeSnapshot
 
 __all__ = ("CTreeSearcher",)
 
 
 class CTreeSearcher:
     @classmethod
-    def _search(
+    def _match(
         cls,
-        ct: CTree,
+        line: str,
+        tags: list[str],
         string: str,
         include_tags: list[str],
         include_mode: Literal["or", "and"],
         exclude_tags: list[str],
-        include_children: bool,
-    ) -> list[CTree]:
-        """рекурсивный поиск."""
+    ) -> bool:
+        """проверка узла (строка и теги) на соответствие критериям поиска."""
 
         def _match_include_tags() -> bool:
             # len(include_tags) == 0 отрабатывается в родительской функции, тут считаем, что теги есть
@@ -28,16 +29,16 @@ class CTreeSearcher:
             if len(re_tags) != 0:
                 match_ = []
                 for tag in re_tags:
-                    match_.append(any(re.fullmatch(tag, ct_tag) for ct_tag in ct.tags))
+                    match_.append(any(re.fullmatch(tag, ct_tag) for ct_tag in tags))
                 if include_mode == "or":
                     match_result.append(any(match_))
                 else:
                     match_result.append(all(match_))
 
             if len(non_re_tags) != 0:
-                if include_mode == "or" and not set(non_re_tags).isdisjoint(set(ct.tags)):
+                if include_mode == "or" and not set(non_re_tags).isdisjoint(set(tags)):
                     match_result.append(True)
-                elif include_mode == "and" and set(non_re_tags).issubset(set(ct.tags)):
+                elif include_mode == "and" and set(non_re_tags).issubset(set(tags)):
                     match_result.append(True)
                 else:
                     match_result.append(False)
@@ -51,23 +52,36 @@ class CTreeSearcher:
 
             if len(re_tags) != 0:
                 for tag in re_tags:
-                    match_result.append(any(re.fullmatch(tag, ct_tag) for ct_tag in ct.tags))
+                    match_result.append(any(re.fullmatch(tag, ct_tag) for ct_tag in tags))
             if len(non_re_tags) != 0:
-                match_result.append(not set(non_re_tags).isdisjoint(set(ct.tags)))
+                match_result.append(not set(non_re_tags).isdisjoint(set(tags)))
 
             return any(match_result)
 
         if include_mode not in ["or", "and"]:
             raise ValueError("incorrect include_mode, 'or' or 'and' are allowed.")
 
-        result = []
-
-        match_string = bool(re.search(string, ct.line)) if len(string) != 0 else True
+        match_string = bool(re.search(string, line)) if len(string) != 0 else True
         match_include_tags = _match_include_tags() if len(include_tags) != 0 else True
         match_exclude_tags = _match_exclude_tags() if len(exclude_tags) != 0 else False
         match_tags = all((match_include_tags, not match_exclude_tags))
 
-        match_result = all((match_string, match_tags))
+        return all((match_string, match_tags))
+
+    @classmethod
+    def _search(
+        cls,
+        ct: CTree,
+        string: str,
+        include_tags: list[str],
+        include_mode: Literal["or", "and"],
+        exclude_tags: list[str],
+        include_children: bool,
+    ) -> list[CTree]:
+        """рекурсивный поиск."""
+        result = []
+
+        match_result = cls._match(ct.line, ct.tags, string, include_tags, include_mode, exclude_tags)
         if match_result:
             result.append(ct.copy(children=include_children))
         if not match_result or not include_children:
@@ -85,10 +99,35 @@ class CTreeSearcher:
 
         return result
 
+    @classmethod
+    def _search_snapshot(
+        cls,
+        snapshot: CTreeSnapshot,
+        string: str,
+        include_tags: list[str],
+        include_mode: Literal["or", "and"],
+        exclude_tags: list[str],
+        include_children: bool,
+    ) -> list[CTree]:
+        """поиск по снимку, в CTree разворачиваются только найденные узлы."""
+        result = []
+        strings, tag_sets = snapshot._tables()
+        stack = [0]
+        while len(stack) != 0:
+            indx = stack.pop()
+            line = strings[snapshot._line[indx]]
+            tags = list(tag_sets[snapshot._tags[indx]])
+            match_result = cls._match(line, tags, string, include_tags, include_mode, exclude_tags)
+            if match_result:
+                result.append(snapshot._thaw_node(indx, include_children, strings, tag_sets))
+            if not match_result or not include_children:
+                stack.extend(reversed(snapshot._node_children(indx)))
+        return result
+
     @classmethod
     def search(
         cls,
-        ct: CTree,
+        ct: CTree | CTreeSnapshot,
         *,
         string: str = "",
         include_tags: list[str] | None = None,
@@ -99,7 +138,7 @@ class CTreeSearcher:
         """Поиск конфигурации в дереве.
 
         Args:
-            ct (ConfigTree): где ищем
+            ct (ConfigTree | CTreeSnapshot): где ищем, снимок разворачивается только в найденных узлах
             string (str): что ищем, может быть regex строкой
             include_tags (list[str]): список тегов, по которым выборку делаем
             include_mode (Literal["or", "and"]): логика объединения критериев поиска
@@ -114,18 +153,28 @@ class CTreeSearcher:
         if exclude_tags is None:
             exclude_tags = []
         string = string.strip()
-        root = ct.__class__()
+        root = ct._class() if isinstance(ct, CTreeSnapshot) else ct.__class__()
         if len(string) == 0 and len(include_tags) == 0 and len(exclude_tags) == 0:
             return root
-        filter_result = cls._search(
-            ct=ct,
-            string=string,
-            include_tags=include_tags,
-            include_mode=include_mode,
-            exclude_tags=exclude_tags,
-            include_children=include_children,
-        )
+        if isinstance(ct, CTreeSnapshot):
+            filter_result = cls._search_snapshot(
+                ct,
+                string=string,
+                include_tags=include_tags,
+                include_mode=include_mode,
+                exclude_tags=exclude_tags,
+                include_children=include_children,
+            )
+        else:
+            filter_result = cls._search(
+                ct=ct,
+                string=string,
+                include_tags=include_tags,
+                include_mode=include_mode,
+                exclude_tags=exclude_tags,
+                include_children=include_children,
+            )
+        # найденные узлы - копии, поэтому переносим их без повторного копирования
         for node in filter_result:
-            root.merge(node)
-        root.update_node_hash()
+            root.merge(node, move=True)
         return root
@@ -1,15 +1,21 @@
-from typing import Any
+from typing import Any, cast
 
 from .ctree import CTree
 from .factory import ctree_class
 from .models import Vendor
 
-__all__ = ("CTreeSerializer",)
+__all__ = (
+    "CTreeRecord",
+    "CTreeSerializer",
+)
+
+# компактное представление узла: (глубина, строка, теги, шаблон, undo-строка)
+CTreeRecord = tuple[int, str, list[str], str, str]
 
 
 class CTreeSerializer:
     @classmethod
-    def to_dict(cls, root: CTree) -> dict[str, Any]:
+    def to_dict(cls, root: CTree, node_hash: bool = False) -> dict[str, Any]:
         children: dict[str, dict[str, Any]] = {}
         result = {
             "line": root.line,
@@ -17,14 +23,21 @@ class CTreeSerializer:
             "template": root.template,
             "undo_line": root.undo_line,
         }
+        if node_hash:
+            result["node_hash"] = root.node_hash
         for child in root.children.values():
-            children |= {child.line: cls.to_dict(child)}
+            children |= {child.line: cls.to_dict(child, node_hash)}
         return result | {"children": children}
 
     @classmethod
-    def from_dict(cls, vendor: Vendor, data: dict[str, Any], parent: CTree | None = None) -> CTree:
-        _ct_class = ctree_class(vendor)
-        node = _ct_class(
+    def _from_dict(
+        cls,
+        ct_class: type[CTree],
+        data: dict[str, Any],
+        parent: CTree | None,
+        trust_hash: bool,
+    ) -> CTree:
+        node = ct_class(
             line=data.get("line", ""),
             tags=data.get("tags", []),
             template=data.get("template", ""),
@@ -32,6 +45,87 @@ class CTreeSerializer:
         )
         node.undo_line = data.get("undo_line", "")
         for child in data.get("children", {}).values():
-            cls.from_dict(vendor, child, node)
-        node.update_node_hash()
+            cls._from_dict(ct_class, child, node, trust_hash)
+        # хеш выставляем после потомков, так как их добавление сбрасывает хеш родителя.
+        # если у потомка хеша нет, то и у узла не выставляем, иначе _invalidate_hash
+        # остановится на потомке и не сбросит хеш узла при изменениях ниже
+        if trust_hash and all(len(child._node_hash) != 0 for child in node.children.values()):
+            node._node_hash = data.get("node_hash", "")
         return node
+
+    @classmethod
+    def from_dict(
+        cls,
+        vendor: Vendor,
+        data: dict[str, Any],
+        parent: CTree | None = None,
+        trust_hash: bool = False,
+    ) -> CTree:
+        """Восстановление дерева из словаря.
+
+        Хеши узлов не вычисляются при загрузке, а считаются один раз при первом обращении.
+
+        Args:
+            vendor (Vendor): вендор, определяет класс узлов
+            data (dict[str, Any]): словарь, полученный через to_dict
+            parent (CTree | None): к какому узлу прикрепить восстановленное дерево
+            trust_hash (bool): использовать хеши, сохраненные через to_dict(node_hash=True),
+                вместо их вычисления. Узлы без сохраненного хеша посчитаются при обращении.
+
+        Returns:
+            CTree: восстановленное дерево
+        """
+        return cls._from_dict(ctree_class(vendor), data, parent, trust_hash)
+
+    @classmethod
+    def to_records(cls, root: CTree) -> list[CTreeRecord]:
+        """Компактная сериализация дерева в плоский список записей (обход в глубину).
+
+        В отличие от to_dict не содержит вложенных словарей, поэтому дешевле передается
+        между процессами (pickle) и быстрее восстанавливается.
+
+        Args:
+            root (CTree): сериализуемое дерево
+
+        Returns:
+            list[CTreeRecord]: записи (глубина, строка, теги, шаблон, undo-строка), корень - глубина 0
+        """
+        records: list[CTreeRecord] = []
+        stack = [(0, root)]
+        while len(stack) != 0:
+            depth, node = stack.pop()
+            records.append((depth, node.line, list(node.tags), node.template, node.undo_line))
+            stack.extend((depth + 1, child) for child in reversed(node.children.values()))
+        return records
+
+    @classmethod
+    def from_records(
+        cls,
+        vendor: Vendor,
+        records: list[CTreeRecord],
+        parent: CTree | None = None,
+    ) -> CTree:
+        """Восстановление дерева из записей, полученных через to_records.
+
+        Args:
+            vendor (Vendor): вендор, определяет класс узлов
+            records (list[CTreeRecord]): записи дерева
+            parent (CTree | None): к какому узлу прикрепить восстановленное дерево
+
+        Returns:
+            CTree: восстановленное дерево
+        """
+        if len(records) == 0:
+            raise ValueError("records should contain at least root node")
+        ct_class = ctree_class(vendor)
+        # section[depth] - последний узел на глубине depth, он же родитель для depth + 1
+        section: list[CTree | None] = [parent]
+        for depth, line, tags, template, undo_line in records:
+            node = ct_class(line=line, parent=section[depth], tags=list(tags))
+            # шаблон и undo-строку берем как есть, а не выводим из строки заново, так как у узлов
+            # diff'а строка может быть уже изменена (undo ...) и с шаблоном не совпадать
+            node.template = template
+            node.undo_line = undo_line
+            del section[depth + 1 :]
+            section.append(node)
+        return cast(CTree, section[1])
@@ -0,0 +1,543 @@
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+import sys
+from array import array
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Literal, Protocol, Sequence, TypeVar
+
+from .ctree import CTree
+from .factory import ctree_class
+from .models import Vendor
+
+__all__ = ("CTreeSnapshot",)
+
+_MAGIC = b"CTSN"
+_VERSION = 1
+# magic, версия, флаги (зарезервировано), число узлов, строк, наборов тегов, длина таблицы тегов, вендор (id строки)
+_HEADER = struct.Struct("<4sHHIIIII")
+_HASH_SIZE = 32
+# массивы узлов в порядке записи
+_NODE_ARRAYS = ("_parent", "_first_child", "_next_sibling", "_line", "_tags", "_template", "_undo_line")
+
+
+T_co = TypeVar("T_co", covariant=True)
+
+
+class _Table(Protocol[T_co]):
+    # таблица строк или наборов тегов: список или ленивая таблица поверх файла
+    def __getitem__(self, indx: int, /) -> T_co: ...
+
+
+class _LazyStrings:
+    """Строки снимка, открытого из файла, декодируются при первом обращении."""
+
+    __slots__ = ("_blob", "_offsets", "_cache")
+
+    def __init__(self, blob: memoryview, offsets: Sequence[int]) -> None:
+        self._blob = blob
+        self._offsets = offsets
+        self._cache: dict[int, str] = {}
+
+    def __getitem__(self, indx: int) -> str:
+        result = self._cache.get(indx)
+        if result is None:
+            result = self._cache[indx] = str(self._blob[self._offsets[indx] : self._offsets[indx + 1]], "utf-8")
+        return result
+
+
+class _LazyTagSets:
+    """Наборы тегов снимка, открытого из файла, собираются при первом обращении."""
+
+    __slots__ = ("_strings", "_offsets", "_ids", "_cache")
+
+    def __init__(self, strings: _LazyStrings, offsets: Sequence[int], ids: Sequence[int]) -> None:
+        self._strings = strings
+        self._offsets = offsets
+        self._ids = ids
+        self._cache: dict[int, tuple[str, ...]] = {}
+
+    def __getitem__(self, indx: int) -> tuple[str, ...]:
+        result = self._cache.get(indx)
+        if result is None:
+            ids = self._ids[self._offsets[indx] : self._offsets[indx + 1]]
+            result = self._cache[indx] = tuple(self._strings[i] for i in ids)
+        return result
+
+
+def _int_array(typecode: str, data: Iterable[int] = ()) -> array[int]:
+    result = array(typecode, data)
+    if result.itemsize != 4:
+        raise RuntimeError(f"array('{typecode}') should be 4 bytes long")
+    return result
+
+
+def _vendor_of(ct_class: type[CTree]) -> Vendor:
+    # у FortinetCT нет свойства vendor, поэтому вендора определяем по классу
+    for vendor in Vendor:
+        if issubclass(ct_class, ctree_class(vendor)):
+            return vendor
+    raise NotImplementedError(f"unknown class {ct_class.__name__}")
+
+
+class CTreeSnapshot:
+    """Неизменяемый снимок дерева в плоских массивах.
+
+    Узлы хранятся в порядке обхода в глубину (корень - индекс 0) в массивах int32: родитель,
+    первый потомок, следующий сосед, id строки, id набора тегов, id шаблона и undo-строки
+    (-1 - нет узла). Строки - одна таблица (utf-8 + смещения) без повторов, наборы тегов -
+    таблица id строк, хеши узлов - по 32 байта (sha256). Объектов на узел не создается, поэтому
+    снимок занимает в памяти на порядок меньше дерева, а to_bytes/from_bytes сводятся к
+    копированию массивов. Из файла (to_file) снимок открывается через mmap без копирования (from_file).
+
+    Для чтения (config, formal_config, patch, CTreeSearcher.search, CTreeDiffer.diff) снимок
+    не разворачивается целиком: поиск и сравнение разворачивают в CTree только найденные
+    или отличающиеся секции. Для изменения дерево восстанавливается через thaw().
+    Префиксы (human diff) в снимке не сохраняются.
+    """
+
+    __slots__ = (
+        "vendor",
+        "_class",
+        *_NODE_ARRAYS,
+        "_hashes",  # хеши узлов подряд, по _HASH_SIZE байт
+        "_string_offsets",  # смещения строк в _strings, последнее - длина _strings
+        "_strings",  # строки в utf-8 подряд
+        "_tag_offsets",  # смещения наборов тегов в _tag_ids
+        "_tag_ids",  # id строк тегов
+    )
+
+    # массивы - array или, для снимка из файла (from_file), memoryview поверх mmap
+    _parent: Sequence[int]
+    _first_child: Sequence[int]
+    _next_sibling: Sequence[int]
+    _line: Sequence[int]
+    _tags: Sequence[int]
+    _template: Sequence[int]
+    _undo_line: Sequence[int]
+    _hashes: bytes | memoryview
+    _string_offsets: Sequence[int]
+    _strings: bytes | memoryview
+    _tag_offsets: Sequence[int]
+    _tag_ids: Sequence[int]
+
+    def __init__(self, vendor: Vendor) -> None:
+        self.vendor = vendor
+        self._class = ctree_class(vendor)
+
+    @classmethod
+    def from_tree(cls, root: CTree) -> CTreeSnapshot:
+        """Снимок дерева.
+
+        Args:
+            root (CTree): корень дерева
+
+        Returns:
+            CTreeSnapshot: снимок, хеши узлов вычисляются при создании
+        """
+        if root.parent is not None:
+            raise ValueError("snapshot can be created only from root node")
+        strings: dict[str, int] = {}
+        tag_sets: dict[tuple[str, ...], int] = {}
+        parent = _int_array("i")
+        first_child = _int_array("i")
+        next_sibling = _int_array("i")
+        last_child = _int_array("i")
+        lines = _int_array("i")
+        tags = _int_array("i")
+        templates = _int_array("i")
+        undo_lines = _int_array("i")
+        hashes = bytearray()
+
+        def string_id(string: str) -> int:
+            indx = strings.get(string)
+            if indx is None:
+                indx = strings[string] = len(strings)
+            return indx
+
+        vendor = _vendor_of(root.__class__)
+        _ = string_id(vendor.value)
+        _ = root.node_hash
+        stack: list[tuple[CTree, int]] = [(root, -1)]
+        while len(stack) != 0:
+            node, parent_indx = stack.pop()
+            indx = len(lines)
+            parent.append(parent_indx)
+            first_child.append(-1)
+            next_sibling.append(-1)
+            last_child.append(-1)
+            if parent_indx != -1:
+                if last_child[parent_indx] == -1:
+                    first_child[parent_indx] = indx
+                else:
+                    next_sibling[last_child[parent_indx]] = indx
+                last_child[parent_indx] = indx
+            lines.append(string_id(node.line))
+            key = tuple(node.tags)
+            tags_indx = tag_sets.get(key)
+            if tags_indx is None:
+                tags_indx = tag_sets[key] = len(tag_sets)
+            tags.append(tags_indx)
+            templates.append(string_id(node.template))
+            undo_lines.append(string_id(node.undo_line))
+            hashes += bytes.fromhex(node.node_hash)
+            stack.extend((child, indx) for child in reversed(node.children.values()))
+
+        snapshot = cls(vendor)
+        snapshot._parent = parent
+        snapshot._first_child = first_child
+        snapshot._next_sibling = next_sibling
+        snapshot._line = lines
+        snapshot._tags = tags
+        snapshot._template = templates
+        snapshot._undo_line = undo_lines
+        snapshot._hashes = bytes(hashes)
+
+        tag_offsets = _int_array("I", [0])
+        tag_ids = _int_array("I")
+        for tag_set in tag_sets:
+            tag_ids.extend(string_id(tag) for tag in tag_set)
+            tag_offsets.append(len(tag_ids))
+        snapshot._tag_offsets = tag_offsets
+        snapshot._tag_ids = tag_ids
+
+        # таблица строк - последней, так как теги тоже добавляют строки
+        encoded = [string.encode() for string in strings]
+        offsets = _int_array("I", [0])
+        for string in encoded:
+            offsets.append(offsets[-1] + len(string))
+        snapshot._string_offsets = offsets
+        snapshot._strings = b"".join(encoded)
+        return snapshot
+
+    def to_bytes(self) -> bytes:
+        """Сериализация снимка: заголовок и массивы как есть (little-endian)."""
+        header = _HEADER.pack(
+            _MAGIC,
+            _VERSION,
+            0,
+            len(self),
+            len(self._string_offsets) - 1,
+            len(self._tag_offsets) - 1,
+            len(self._tag_ids),
+            0,  # вендор - всегда первая строка таблицы (from_tree)
+        )
+        result: list[bytes | memoryview] = [header]
+        for name in _NODE_ARRAYS:
+            result.append(self._array_bytes(getattr(self, name)))
+        result.append(self._hashes)
+        result.append(self._array_bytes(self._string_offsets))
+        result.append(self._array_bytes(self._tag_offsets))
+        result.append(self._array_bytes(self._tag_ids))
+        result.append(self._strings)
+        return b"".join(result)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> CTreeSnapshot:
+        """Восстановление снимка из to_bytes, массивы копируются без разбора узлов.
+
+        Args:
+            data (bytes): результат to_bytes
+
+        Returns:
+            CTreeSnapshot: снимок
+        """
+        return cls._load(data)
+
+    def to_file(self, path: Path | str) -> None:
+        """Запись снимка (to_bytes) в файл для последующего открытия через from_file."""
+        # пишем во временный файл и переименовываем, что бы не оставить недописанный файл
+        path = Path(path)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(self.to_bytes())
+        os.replace(tmp, path)
+
+    @classmethod
+    def from_file(cls, path: Path | str) -> CTreeSnapshot:
+        """Открытие снимка из файла (to_file) через mmap без чтения файла целиком.
+
+        Массивы узлов и таблицы ссылаются на страницы файла без копирования, строки
+        декодируются при первом обращении, поэтому открытие не зависит от размера дерева,
+        а поиск и сравнение читают с диска только нужные страницы. Файл нельзя менять,
+        пока снимок используется.
+
+        Args:
+            path (Path | str): файл со снимком
+
+        Returns:
+            CTreeSnapshot: снимок
+        """
+        with open(path, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if sys.byteorder == "big":
+            # массивы в файле little-endian, на big-endian их нужно переставить, т.е. скопировать
+            return cls._load(data[:])
+        return cls._load(memoryview(data))
+
+    @classmethod
+    def _load(cls, data: bytes | memoryview) -> CTreeSnapshot:
+        # из bytes массивы копируются, из memoryview (mmap) - ссылаются на данные без копирования
+        if len(data) < _HEADER.size:
+            raise ValueError("data is too short for snapshot header")
+        magic, version, _, nodes, strings, tag_sets, tag_ids, vendor_id = _HEADER.unpack_from(data)
+        if magic != _MAGIC:
+            raise ValueError("data is not a ctree snapshot")
+        if version != _VERSION:
+            raise ValueError(f"unsupported snapshot version {version}")
+        size = _HEADER.size + (len(_NODE_ARRAYS) * 4 + _HASH_SIZE) * nodes + (strings + tag_sets + 2 + tag_ids) * 4
+        if len(data) < size:
+            raise ValueError("snapshot data is truncated")
+
+        offset = _HEADER.size
+
+        def read(typecode: Literal["i", "I"], count: int) -> Sequence[int]:
+            nonlocal offset
+            chunk = data[offset : offset + count * 4]
+            offset += count * 4
+            if isinstance(chunk, memoryview):
+                return chunk.cast(typecode)
+            result = _int_array(typecode)
+            result.frombytes(chunk)
+            if sys.byteorder == "big":
+                result.byteswap()
+            return result
+
+        node_arrays = [read("i", nodes) for _ in _NODE_ARRAYS]
+        hashes = data[offset : offset + nodes * _HASH_SIZE]
+        offset += nodes * _HASH_SIZE
+        string_offsets = read("I", strings + 1)
+        tag_offsets = read("I", tag_sets + 1)
+        tag_id_array = read("I", tag_ids)
+        blob = data[offset : offset + string_offsets[-1]]
+        if len(blob) != string_offsets[-1]:
+            raise ValueError("snapshot data is truncated")
+
+        vendor = Vendor(str(blob[string_offsets[vendor_id] : string_offsets[vendor_id + 1]], "utf-8"))
+        snapshot = cls(vendor)
+        for name, values in zip(_NODE_ARRAYS, node_arrays, strict=True):
+            setattr(snapshot, name, values)
+        snapshot._hashes = hashes
+        snapshot._string_offsets = string_offsets
+        snapshot._strings = blob
+        snapshot._tag_offsets = tag_offsets
+        snapshot._tag_ids = tag_id_array
+        return snapshot
+
+    @staticmethod
+    def _array_bytes(values: Sequence[int]) -> bytes:
+        if isinstance(values, array):
+            if sys.byteorder == "big":
+                values = array(values.typecode, values)
+                values.byteswap()
+            return values.tobytes()
+        # memoryview бывает только у снимка из файла на little-endian, байты уже в нужном порядке
+        return bytes(values)
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        return (self.__class__.from_bytes, (self.to_bytes(),))
+
+    def __len__(self) -> int:
+        """число узлов, включая корень."""
+        return len(self._line)
+
+    def _tables(self) -> tuple[_Table[str], _Table[tuple[str, ...]]]:
+        # строки и наборы тегов декодируются один раз на операцию, а не на каждый узел
+        if isinstance(self._strings, memoryview):
+            # снимок из файла - декодируем только то, к чему обращаются
+            strings = _LazyStrings(self._strings, self._string_offsets)
+            return strings, _LazyTagSets(strings, self._tag_offsets, self._tag_ids)
+        offsets = self._string_offsets
+        text = self._strings.decode()
+        if len(text) == len(self._strings):
+            # только ascii - смещения в байтах совпадают со смещениями в символах
+            string_list = [text[offsets[indx] : offsets[indx + 1]] for indx in range(len(offsets) - 1)]
+        else:
+            blob = self._strings
+            string_list = [blob[offsets[indx] : offsets[indx + 1]].decode() for indx in range(len(offsets) - 1)]
+        tag_ids = self._tag_ids
+        tag_offsets = self._tag_offsets
+        tag_sets = [
+            tuple(string_list[i] for i in tag_ids[tag_offsets[indx] : tag_offsets[indx + 1]])
+            for indx in range(len(tag_offsets) - 1)
+        ]
+        return string_list, tag_sets
+
+    def _node_hash(self, indx: int) -> str:
+        return self._hashes[indx * _HASH_SIZE : (indx + 1) * _HASH_SIZE].hex()
+
+    def _node_children(self, indx: int) -> list[int]:
+        # индексы потомков узла по порядку
+        result = []
+        child = self._first_child[indx]
+        while child != -1:
+            result.append(child)
+            child = self._next_sibling[child]
+        return result
+
+    @property
+    def node_hash(self) -> str:
+        return self._node_hash(0)
+
+    def sections(self) -> Iterator[tuple[str, str]]:
+        """(строка, хеш) секций верхнего уровня по порядку."""
+        blob = self._strings
+        offsets = self._string_offsets
+        for child in self._node_children(0):
+            line = self._line[child]
+            yield str(blob[offsets[line] : offsets[line + 1]], "utf-8"), self._node_hash(child)
+
+    def _walk(self, indx: int) -> Iterator[tuple[int, int]]:
+        # (индекс, уровень относительно indx) обходом в глубину, начиная с indx
+        stack = [(indx, 0)]
+        while len(stack) != 0:
+            node, level = stack.pop()
+            yield node, level
+            stack.extend((child, level + 1) for child in reversed(self._node_children(node)))
+
+    def _new(
+        self,
+        indx: int,
+        parent: CTree | None,
+        strings: _Table[str],
+        tag_sets: _Table[tuple[str, ...]],
+        node_hash: str = "",
+    ) -> CTree:
+        # узел создается без __init__: строка уже очищена, шаблон и undo-строка известны,
+        # а хеш берется из снимка, поэтому сбрасывать хеши родителей не нужно
+        node = self._class.__new__(self._class)
+        node._line = strings[self._line[indx]]
+        node._parent = parent
+        node._path = None
+        node.children = {}
+        node.tags = list(tag_sets[self._tags[indx]])
+        node.template = strings[self._template[indx]]
+        node.undo_line = strings[self._undo_line[indx]]
+        node.prefix = ""
+        node._node_hash = node_hash
+        if parent is not None:
+            parent.children[node._line] = node
+        return node
+
+    def _thaw_subtree(
+        self,
+        indx: int,
+        parent: CTree | None,
+        strings: _Table[str],
+        tag_sets: _Table[tuple[str, ...]],
+    ) -> CTree:
+        root = self._new(indx, parent, strings, tag_sets, self._node_hash(indx))
+        stack = [(indx, root)]
+        while len(stack) != 0:
+            node_indx, node = stack.pop()
+            for child in self._node_children(node_indx):
+                stack.append((child, self._new(child, node, strings, tag_sets, self._node_hash(child))))
+        return root
+
+    def _thaw_node(self, indx: int, children: bool, strings: _Table[str], tag_sets: _Table[tuple[str, ...]]) -> CTree:
+        # аналог CTree.copy: корень копии узла с цепочкой родителей (без их остальных потомков)
+        path = []
+        parent_indx = self._parent[indx]
+        while parent_indx != -1:
+            path.append(parent_indx)
+            parent_indx = self._parent[parent_indx]
+        parent = None
+        for parent_indx in reversed(path):
+            parent = self._new(parent_indx, parent, strings, tag_sets)
+        if children:
+            node = self._thaw_subtree(indx, parent, strings, tag_sets)
+        else:
+            node = self._new(indx, parent, strings, tag_sets)
+        while node.parent is not None:
+            node = node.parent
+        return node
+
+    def thaw(self, sections: Iterable[str] | None = None) -> CTree:
+        """Восстановление дерева из снимка.
+
+        Args:
+            sections (Iterable[str] | None): строки секций верхнего уровня, которые нужно
+                восстановить, по умолчанию - все
+
+        Returns:
+            CTree: дерево
+        """
+        strings, tag_sets = self._tables()
+        if sections is None:
+            return self._thaw_subtree(0, None, strings, tag_sets)
+        required = set(sections)
+        root = self._new(0, None, strings, tag_sets)
+        for child in self._node_children(0):
+            if strings[self._line[child]] in required:
+                _ = self._thaw_subtree(child, root, strings, tag_sets)
+        return root
+
+    def _build_config(self, masked: bool) -> str:
+        proto = self._class()
+        strings, _ = self._tables()
+        result = []
+        for child in self._node_children(0):
+            for indx, level in self._walk(child):
+                line = strings[self._line[indx]]
+                result.append(proto.spaces * level + (proto.mask_line(line) if masked else line))
+            result.append(proto.section_separator)
+        return "\n".join(result)
+
+    @property
+    def config(self) -> str:
+        return self._build_config(masked=False)
+
+    @property
+    def masked_config(self) -> str:
+        return self._build_config(masked=True)
+
+    @property
+    def formal_config(self) -> str:
+        strings, _ = self._tables()
+        result = []
+        path: list[str] = []
+        for child in self._node_children(0):
+            for indx, level in self._walk(child):
+                del path[level:]
+                path.append(strings[self._line[indx]])
+                if self._first_child[indx] == -1:
+                    result.append(" / ".join(path))
+        return "\n".join(result)
+
+    def _build_patch(self, masked: bool) -> str:
+        if self._class._build_patch is not CTree._build_patch:
+            # вендор со своей логикой построения патча
+            root = self.thaw()
+            return root.masked_patch if masked else root.patch
+        proto = self._class()
+        strings, _ = self._tables()
+        without_exit = self._class.compiled_pattern("sections_without_exit")
+        require_exit = self._class.compiled_pattern("sections_require_exit")
+        result = []
+        # (индекс, формальный путь), индекс -1 - выход из секции
+        stack = [(child, strings[self._line[child]]) for child in reversed(self._node_children(0))]
+        while len(stack) != 0:
+            indx, path = stack.pop()
+            if indx == -1:
+                result.append(proto.section_exit)
+                continue
+            line = strings[self._line[indx]]
+            result.append(proto.mask_line(line) if masked else line)
+            if self._first_child[indx] != -1:
+                if without_exit is None or not without_exit.fullmatch(path):
+                    stack.append((-1, ""))
+                children = [(child, f"{path} / {strings[self._line[child]]}") for child in self._node_children(indx)]
+                stack.extend(reversed(children))
+            elif require_exit is not None and require_exit.fullmatch(path):
+                stack.append((-1, ""))
+        return "\n".join(result)
+
+    @property
+    def patch(self) -> str:
+        return self._build_patch(masked=False)
+
+    @property
+    def masked_patch(self) -> str:
+        return self._build_patch(masked=True)
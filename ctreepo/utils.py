@@ -0,0 +1,55 @@
+__all__ = ("literal_prefix",)
+
+_METACHARS = frozenset(".^$*+?{}[]\\|()")
+_QUANTIFIERS = frozenset("*+?{")
+
+
+def _has_top_level_alternation(pattern: str) -> bool:
+    depth = 0
+    in_class = False
+    indx = 0
+    while indx < len(pattern):
+        char = pattern[indx]
+        if char == "\\":
+            indx += 2
+            continue
+        if in_class:
+            if char == "]":
+                in_class = False
+        elif char == "[":
+            in_class = True
+            # "]" сразу после "[" или "[^" - это символ, а не конец класса
+            if pattern[indx + 1 : indx + 2] == "^":
+                indx += 1
+            if pattern[indx + 1 : indx + 2] == "]":
+                indx += 1
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "|" and depth == 0:
+            return True
+        indx += 1
+    return False
+
+
+def literal_prefix(pattern: str) -> str:
+    """Литеральное (без спецсимволов) начало regex-паттерна.
+
+    Любая строка, совпадающая с паттерном с первого символа (match/fullmatch), начинается с этого
+    префикса. Если префикс определить нельзя (спецсимвол в начале, альтернатива на верхнем уровне),
+    возвращается пустая строка.
+
+    Args:
+        pattern (str): regex-паттерн
+
+    Returns:
+        str: литеральный префикс паттерна
+    """
+    if _has_top_level_alternation(pattern):
+        return ""
+    for indx, char in enumerate(pattern):
+        if char in _METACHARS:
+            # квантификатор относится к предыдущему символу, он в префикс не входит
+            return pattern[: indx - 1] if char in _QUANTIFIERS and indx > 0 else pattern[:indx]
+    return pattern
@@ -1,6 +1,6 @@
 import re
 from collections import deque
-from typing import Self
+from typing import Iterable, Iterator, Self
 
 from .ctree import CTree
 from .models import Vendor
@@ -59,6 +59,8 @@ class CiscoCT(CTree):
         r".*secret (?:5|9|7) (\S+)",
     ]
     new_line_mask = "<<br>>"
+    # сколько строк баннера копим при потоковом разборе, пока ждем закрывающий разделитель
+    banner_max_lines = 1000
 
     @classmethod
     def _mask_banners(cls, config: str) -> str:
@@ -92,6 +94,72 @@ class CiscoCT(CTree):
         config = cls._mask_certificates(config)
         return config
 
+    @classmethod
+    def _mask_banners_lines(cls, lines: Iterable[str]) -> Iterator[str]:
+        # многострочный баннер склеиваем в одну строку до строки, заканчивающейся разделителем.
+        # как и в _mask_banners, разделитель - начало первого слова после типа баннера (^C для
+        # "^CWelcome"), которое повторяется в конце одной из следующих строк
+        source = iter(lines)
+        pending: deque[str] = deque()
+        banner: list[str] = []
+        seps: tuple[str, ...] = ()
+        while True:
+            if len(pending) != 0:
+                line = pending.popleft()
+            elif (next_line := next(source, None)) is not None:
+                line = next_line
+            elif len(banner) != 0:
+                # баннер без закрывающего разделителя оставляем как есть, а строки после
+                # заголовка разбираем заново, в них могут быть другие баннеры
+                yield banner[0]
+                pending.extend(banner[1:])
+                banner = []
+                continue
+            else:
+                break
+
+            if len(banner) != 0:
+                banner.append(line)
+                if line.endswith(seps):
+                    yield cls.new_line_mask.join(banner)
+                    banner = []
+                elif len(banner) > cls.banner_max_lines:
+                    # не копим в памяти остаток конфигурации, если баннер так и не закрылся
+                    yield banner[0]
+                    pending.extend(banner[1:])
+                    banner = []
+                continue
+            # баннер на одной строке (текст между двумя разделителями) пропускаем как есть
+            if re.fullmatch(r"banner (?:motd|login|exec) (?P<sep>\S+?)(?P<body>.+)(?P=sep)", line) is None:
+                m = re.fullmatch(r"banner (?:motd|login|exec) (?P<sep>\S+).*", line)
+                if m is not None:
+                    token = m.group("sep")
+                    seps = tuple(token[:indx] for indx in range(len(token), 0, -1))
+                    banner.append(line)
+                    continue
+            yield line
+
+    @classmethod
+    def _mask_certificates_lines(cls, lines: Iterable[str]) -> Iterator[str]:
+        # тело сертификата (до строки с quit) склеиваем в одну строку
+        certificate: list[str] | None = None
+        for line in lines:
+            if certificate is not None:
+                certificate.append(line)
+                if re.fullmatch(r"(?:.*\s)?quit", line) and (line != "quit" or len(certificate) > 1):
+                    yield cls.new_line_mask.join(certificate)
+                    certificate = None
+                continue
+            if re.fullmatch(r"\s*certificate(?: ca| self-signed)? \S+", line):
+                certificate = []
+            yield line
+        if certificate is not None:
+            yield from certificate
+
+    @classmethod
+    def pre_run_lines(cls, lines: Iterable[str]) -> Iterator[str]:
+        return cls._mask_certificates_lines(cls._mask_banners_lines(lines))
+
     def post_run(self) -> None:
         for node in self.children.values():
             if node.line.startswith(("banner motd", "banner exec", "banner login")):
@@ -155,9 +223,13 @@ class HuaweiCT(CTree):
         # #
         # поэтому удаляем пробел из конфигурации перед анализом
 
-        result = []
+        return "\n".join(cls._remove_spaces_lines(config.splitlines()))
+
+    @classmethod
+    def _remove_spaces_lines(cls, lines: Iterable[str]) -> Iterator[str]:
         section = False
-        for line in config.splitlines():
+        space_count = 0
+        for line in lines:
             if len(line) == 0:
                 continue
             if line == "#":
@@ -168,10 +240,9 @@ class HuaweiCT(CTree):
             if line.startswith(" ") and not section:
                 if space_count == 0:
                     space_count = len(line) - len(line.lstrip())
-                result.append(line.removeprefix(" " * space_count))
+                yield line.removeprefix(" " * space_count)
             else:
-                result.append(line)
-        return "\n".join(result)
+                yield line
 
     @classmethod
     def _expand_vty(cls, config: str) -> str:
@@ -196,12 +267,38 @@ class HuaweiCT(CTree):
 
         return config
 
+    @classmethod
+    def _expand_vty_lines(cls, lines: Iterable[str]) -> Iterator[str]:
+        block: list[str] = []
+        vty_range = range(0)
+        for line in lines:
+            if len(block) != 0:
+                # параметры диапазона vty - все строки с отступом после заголовка
+                if line[:1].isspace():
+                    block.append(line)
+                    continue
+                for vty in vty_range:
+                    yield f"user-interface vty {vty}"
+                    yield from block[1:]
+                block = []
+            if m := re.fullmatch(r"user-interface vty (?P<start>\d+) (?P<end>\d+)", line):
+                block.append(line)
+                vty_range = range(int(m.group("start")), int(m.group("end")) + 1)
+                continue
+            yield line
+        # диапазон в самом конце конфигурации (без завершающей строки) не раскрываем
+        yield from block
+
     @classmethod
     def pre_run(cls, config: str) -> str:
         config = cls._remove_spaces(config)
         config = cls._expand_vty(config)
         return config
 
+    @classmethod
+    def pre_run_lines(cls, lines: Iterable[str]) -> Iterator[str]:
+        return cls._expand_vty_lines(cls._remove_spaces_lines(lines))
+
 
 class FortinetCT(CTree):
     platform = Vendor.FORTINET
@@ -262,6 +359,45 @@ class FortinetCT(CTree):
             f.write(config)
         return config
 
+    @classmethod
+    def _mask_certificates_lines(cls, lines: Iterable[str]) -> Iterator[str]:
+        # значение в кавычках может занимать несколько строк, их пропускаем до закрывающей кавычки
+        prefix: str | None = None
+        for line in lines:
+            if prefix is not None:
+                if '"' in line:
+                    yield prefix + '""' + line[line.index('"') + 1 :]
+                    prefix = None
+                continue
+            if m := re.search(r'set (?:certificate|private-key) "', line):
+                rest = line[m.end() :]
+                if '"' in rest:
+                    yield line[: m.end()] + '"' + rest[rest.index('"') + 1 :]
+                else:
+                    prefix = line[: m.end() - 1]
+                continue
+            yield line
+
+    @classmethod
+    def _mask_buffer_lines(cls, lines: Iterable[str]) -> Iterator[str]:
+        prefix: str | None = None
+        for line in lines:
+            if prefix is not None:
+                if line.endswith('"'):
+                    yield prefix + '""'
+                    prefix = None
+                continue
+            if (m := re.search(r'set buffer "', line)) and not line[m.end() :].endswith('"'):
+                prefix = line[: m.end() - 1]
+                continue
+            if m is not None:
+                line = line[: m.end()] + '"'
+            yield line
+
+    @classmethod
+    def pre_run_lines(cls, lines: Iterable[str]) -> Iterator[str]:
+        return cls._mask_buffer_lines(cls._mask_certificates_lines(lines))
+
 
 class ArubaCT(CTree):
     vendor = Vendor.ARUBA
@@ -0,0 +1,86 @@
+from textwrap import dedent
+
+from ctreepo import CTreeParser, Vendor
+from ctreepo.ctree import CTree
+from ctreepo.factory import ctree_factory
+
+config = dedent(
+    """
+    interface gi0/0/0
+     description test
+     ip address 1.1.1.1 255.255.255.252
+    #
+    interface gi0/0/1
+     ip address 1.1.1.2 255.255.255.252
+    #
+    ntp-service unicast-server 1.2.3.4
+    #
+    """
+).strip()
+
+
+def _is_dirty(node: CTree) -> bool:
+    return len(node._node_hash) == 0
+
+
+def test_lazy_hash() -> None:
+    parser = CTreeParser(Vendor.HUAWEI)
+    root = parser.parse(config)
+    assert _is_dirty(root)
+    root_hash = root.node_hash
+    assert not _is_dirty(root)
+    assert all(not _is_dirty(node) for node in root.children.values())
+
+    eager = parser.parse(config)
+    eager.update_node_hash()
+    assert eager._node_hash == root_hash
+
+
+def test_hash_invalidation() -> None:
+    parser = CTreeParser(Vendor.HUAWEI)
+    root = parser.parse(config)
+    original = root.node_hash
+    intf_0 = root.children["interface gi0/0/0"]
+    intf_1 = root.children["interface gi0/0/1"]
+    intf_1_hash = intf_1.node_hash
+
+    # изменение строки сбрасывает хеш узла и предков, но не соседей
+    description = intf_0.children["description test"]
+    description.line = "description new"
+    intf_0.rebuild()
+    assert _is_dirty(description)
+    assert _is_dirty(intf_0)
+    assert _is_dirty(root)
+    assert not _is_dirty(intf_1)
+    assert root.node_hash != original
+    assert intf_1.node_hash == intf_1_hash
+
+    # новый потомок
+    changed = root.node_hash
+    _ = ctree_factory(Vendor.HUAWEI, "mtu 9000", intf_1)
+    assert _is_dirty(root)
+    assert intf_1.node_hash != intf_1_hash
+    assert root.node_hash != changed
+
+    # удаление потомка возвращает хеш к исходному значению
+    intf_1.children["mtu 9000"].delete()
+    assert _is_dirty(root)
+    assert intf_1.node_hash == intf_1_hash
+
+    description.line = "description test"
+    intf_0.rebuild()
+    assert root.node_hash == original
+
+
+def test_hash_copy_apply() -> None:
+    parser = CTreeParser(Vendor.HUAWEI)
+    root = parser.parse(config)
+    root_hash = root.node_hash
+    copy = root.copy()
+    assert not _is_dirty(copy)
+    assert copy.node_hash == root_hash
+
+    diff = parser.parse("interface gi0/0/1\n mtu 9000\n#")
+    applied = root.apply(diff)
+    assert applied.node_hash != root_hash
+    assert applied.node_hash == parser.parse(applied.config).node_hash
@@ -0,0 +1,42 @@
+from ctreepo.vendors import AristaCT, FortinetCT, HuaweiCT
+
+
+def test_compiled_pattern_cached() -> None:
+    pattern = HuaweiCT.compiled_pattern("junk_lines")
+    assert pattern is not None
+    assert pattern is HuaweiCT.compiled_pattern("junk_lines")
+    assert pattern.pattern == "|".join(HuaweiCT.junk_lines)
+    assert pattern.fullmatch("return") is not None
+    assert pattern.fullmatch("interface gi0/0/0") is None
+
+
+def test_compiled_pattern_empty() -> None:
+    assert FortinetCT.compiled_pattern("mask_patterns") is None
+    assert FortinetCT.compiled_pattern("sections_require_exit") is None
+    assert FortinetCT.mask_line("set password secret") == "set password secret"
+
+
+def test_compiled_pattern_override() -> None:
+    class CustomAristaCT(AristaCT):
+        junk_lines = [r"\s*%.*"]
+
+    base = AristaCT.compiled_pattern("junk_lines")
+    custom = CustomAristaCT.compiled_pattern("junk_lines")
+    assert base is not None and custom is not None
+    assert base is not custom
+    assert custom.fullmatch("% comment") is not None
+    assert custom.fullmatch("! comment") is None
+
+    # изменение списка в классе приводит к перекомпиляции
+    CustomAristaCT.junk_lines = [r"\s*#.*"]
+    updated = CustomAristaCT.compiled_pattern("junk_lines")
+    assert updated is not None and updated is not custom
+    assert updated.fullmatch("# comment") is not None
+    assert AristaCT.compiled_pattern("junk_lines") is base
+
+    # как и добавление паттерна в тот же список
+    CustomAristaCT.junk_lines.append(r"\s*%.*")
+    appended = CustomAristaCT.compiled_pattern("junk_lines")
+    assert appended is not None and appended is not updated
+    assert appended.fullmatch("% comment") is not None
+    assert CustomAristaCT.compiled_pattern("junk_lines") is appended
@@ -1,6 +1,10 @@
 from textwrap import dedent
+from typing import Any
 
-from ctreepo import CTreeDiffer, CTreeParser, Vendor
+import pytest
+
+from ctreepo import CTree, CTreeDiffer, CTreeParser, DiffCache, Vendor
+from ctreepo.differ import _AppliedView
 
 current_config = dedent(
     """
@@ -242,3 +246,157 @@ def test_rule_with_undo() -> None:
 
     assert diff.config == diff_config
     assert diff_raw.config == diff_config_raw
+
+
+
+def test_differ_template_siblings() -> None:
+    current_str = dedent(
+        """
+        ip ip-prefix PL-1 index 10 permit 10.0.0.0 8
+        ip ip-prefix PL-1 index 20 permit 10.1.0.0 16
+        ip ip-prefix PL-1 index 30 permit 10.2.0.0 16
+        ip ip-prefix PL-2 index 10 permit 10.3.0.0 16
+        ip as-path-filter AS-1 index 10 permit _65000$
+        """
+    )
+    target_str = dedent(
+        """
+        ip ip-prefix PL-1 index 10 permit 10.0.0.0 8
+        ip ip-prefix PL-1 index 20 permit 10.1.0.0 24
+        ip ip-prefix PL-1 index 30 permit 10.2.0.0 24
+        ip ip-prefix PL-2 index 10 permit 10.3.0.0 16
+        ip as-path-filter AS-1 index 10 permit _65001$
+        """
+    )
+    template_str = dedent(
+        r"""
+        ip ip-prefix (\S+) index (\d+) (?P<RULE>.*)          UNDO>> undo ip ip-prefix \1 index \2
+        """
+    )
+    diff_config = dedent(
+        """
+        ip ip-prefix PL-1 index 20 permit 10.1.0.0 24
+        #
+        ip ip-prefix PL-1 index 30 permit 10.2.0.0 24
+        #
+        ip as-path-filter AS-1 index 10 permit _65001$
+        #
+        undo ip as-path-filter AS-1 index 10 permit _65000$
+        #
+        """
+    ).strip()
+    parser = CTreeParser(Vendor.HUAWEI)
+
+    template = parser.parse(template_str)
+    current = parser.parse(current_str, template)
+    target = parser.parse(target_str, template)
+
+    diff = CTreeDiffer().diff(current, target)
+
+    assert diff.config == diff_config
+
+
+def _view_to_dict(node: CTree | _AppliedView) -> dict[str, Any]:
+    return {line: _view_to_dict(child) for line, child in node.children.items()}
+
+
+def test_applied_view() -> None:
+    current = dedent(
+        """
+        interface 25GE1/0/1
+         description old
+         port link-type trunk
+         undo stp enable
+        #
+        interface 25GE1/0/2
+         port link-type trunk
+        #
+        ntp-service unicast-server 1.2.3.4
+        #
+        undo telnet server enable
+        #
+        """
+    ).strip()
+    target = dedent(
+        """
+        interface 25GE1/0/1
+         description new
+         port link-type trunk
+        #
+        interface 25GE1/0/2
+         port link-type trunk
+        #
+        """
+    ).strip()
+    parser = CTreeParser(Vendor.HUAWEI)
+    a = parser.parse(current)
+    b = parser.parse(target)
+    existed_diff = CTreeDiffer.diff(a, b, post_proc_rules=[])
+    view = _AppliedView(a, existed_diff)
+    # представление совпадает с копией, к которой применен diff
+    applied = a.apply(existed_diff)
+    assert _view_to_dict(view) == _view_to_dict(applied)
+    assert view.line == a.line
+    assert view.node_hash == ""
+    intf = view.children["interface 25GE1/0/1"]
+    assert isinstance(intf, _AppliedView)
+    assert intf.masked_line == "interface 25GE1/0/1"
+    # узлы без изменений - исходные узлы без копирования
+    assert view.children["interface 25GE1/0/2"] is a.children["interface 25GE1/0/2"]
+    assert view.children is view.children
+
+
+def test_differ_masked_sections() -> None:
+    current = dedent(
+        """
+        interface 25GE1/0/1
+         description old
+         port link-type trunk
+        #
+        local-user admin password irreversible-cipher secret_1
+        #
+        """
+    ).strip()
+    target = dedent(
+        """
+        interface 25GE1/0/1
+         description new
+         port link-type trunk
+        #
+        local-user admin password irreversible-cipher secret_2
+        #
+        """
+    ).strip()
+    parser = CTreeParser(Vendor.HUAWEI)
+    diff = CTreeDiffer.diff(parser.parse(current), parser.parse(target), masked=True, post_proc_rules=[])
+    assert diff.config == dedent(
+        """
+        interface 25GE1/0/1
+         undo description old
+         description new
+        #
+        """
+    ).strip()
+
+
+def test_diff_many() -> None:
+    parser = CTreeParser(Vendor.HUAWEI)
+    template = parser.parse("interface \\S+\n description (?P<DESCRIPTION>.*)\n#")
+    target = parser.parse(target_config, template)
+    currents = [
+        ("device-1", parser.parse(current_config, template)),
+        ("device-2", parser.parse(current_config.replace("sflow sampling inbound", "description old"), template)),
+        ("device-3", parser.parse(target_config, template)),
+        ("device-4", parser.parse(current_config, template)),
+    ]
+    cache = DiffCache()
+    result = dict(CTreeDiffer.diff_many(currents, target, diff_cache=cache))
+    assert list(result) == ["device-1", "device-2", "device-3", "device-4"]
+    for key, current in currents:
+        assert result[key].patch == CTreeDiffer.diff(current, target).patch
+    assert result["device-3"].config == ""
+    # одинаковые секции у разных устройств сравниваются один раз
+    assert cache.info().hits != 0
+
+    with pytest.raises(RuntimeError):
+        _ = list(CTreeDiffer.diff_many([("device-1", CTreeParser(Vendor.CISCO).parse("")), *currents], target))
@@ -270,3 +270,57 @@ def test_differ_human_no_diff() -> None:
     target = parser.parse(current_config)
     diff = CTreeDiffer.human_diff(current=current, target=target, mode="diff-only")
     assert diff == expected_diff
+
+
+def test_differ_human_iter() -> None:
+    """Построчный human diff, секция с потомком, совпадающим по строке с самой секцией."""
+    current_config = dedent(
+        """
+        section 1
+         section 1
+          line 1
+          line 2
+        !
+        line 3
+        !
+        """
+    ).strip()
+    target_config = dedent(
+        """
+        section 1
+         section 1
+          line 1
+        !
+        line 3
+        !
+        line 4
+        !
+        """
+    ).strip()
+    expected_diff = [
+        " section 1",
+        "  section 1",
+        "   line 1",
+        "-  line 2",
+        " !",
+        " line 3",
+        " !",
+        "+line 4",
+        " !",
+    ]
+
+    parser = CTreeParser(Vendor.CISCO)
+    current = parser.parse(current_config)
+    target = parser.parse(target_config)
+    diff = CTreeDiffer.iter_human_diff(current=current, target=target, mode="full")
+    assert next(diff) == expected_diff[0]
+    assert [expected_diff[0], *diff] == expected_diff
+    assert CTreeDiffer.human_diff(current=current, target=target, mode="full") == "\n".join(expected_diff)
+    assert list(CTreeDiffer.iter_human_diff(current=current, target=target)) == [
+        " section 1",
+        "  section 1",
+        "-  line 2",
+        " !",
+        "+line 4",
+        " !",
+    ]
@@ -1,6 +1,7 @@
 from textwrap import dedent
 
-from ctreepo import CTreeDiffer, CTreeParser, Vendor
+from ctreepo import CTreeDiffer, CTreeEnv, CTreeParser, Vendor
+from ctreepo.differ import _SectionRules
 
 
 def test_differ_ordered_section() -> None:
@@ -259,3 +260,132 @@ def test_differ_ordered_root() -> None:
 
     ordered_diff = CTreeDiffer.diff(current, target, ordered_sections=[""], reorder_root=False)
     assert ordered_diff.config == ordered_diff_config
+
+
+def test_differ_ordered_lcs() -> None:
+    entries = [f" permit host 10.0.0.{i}" for i in range(1, 11)]
+    current_config = "\n".join(["ip access-list standard ACL", *entries])
+    target_entries = [
+        entries[0],
+        " permit host 10.0.1.1",
+        *entries[1:4],
+        *entries[5:],
+        " permit host 10.0.1.2",
+    ]
+    target_config = "\n".join(["ip access-list standard ACL", *target_entries])
+    diff_positional = "\n".join(
+        [
+            "ip access-list standard ACL",
+            *[f" no{entry}" for entry in entries[1:]],
+            *target_entries[1:],
+            "!",
+        ]
+    )
+    diff_lcs = dedent(
+        """
+        ip access-list standard ACL
+         no permit host 10.0.0.5
+         permit host 10.0.1.1
+         permit host 10.0.1.2
+        !
+        """
+    ).strip()
+
+    parser = CTreeParser(Vendor.CISCO)
+    current = parser.parse(current_config)
+    target = parser.parse(target_config)
+    ordered_sections = [r"ip access-list standard \S+"]
+
+    diff = CTreeDiffer.diff(current, target, ordered_sections=ordered_sections)
+    assert diff.config == diff_positional
+
+    diff = CTreeDiffer.diff(current, target, ordered_sections=ordered_sections, ordered_mode="lcs")
+    assert diff.config == diff_lcs
+
+    # изменений мало - остаемся в lcs, много - позиционное сравнение
+    diff = CTreeDiffer.diff(
+        current,
+        target,
+        ordered_sections=ordered_sections,
+        ordered_mode="lcs",
+        ordered_fallback_ratio=0.2,
+    )
+    assert diff.config == diff_lcs
+    diff = CTreeDiffer.diff(
+        current,
+        target,
+        ordered_sections=ordered_sections,
+        ordered_mode="lcs",
+        ordered_fallback_ratio=0.1,
+    )
+    assert diff.config == diff_positional
+
+    env = CTreeEnv(Vendor.CISCO, ordered_sections=ordered_sections, ordered_mode="lcs")
+    assert env.diff(env.parse(current_config), env.parse(target_config)).config == diff_lcs
+
+
+def test_differ_ordered_lcs_nested() -> None:
+    # вложенные секции и корень в режиме lcs
+    current_config = dedent(
+        """
+        dns server 1.1.1.3
+        dns server 1.1.1.1
+        section 1
+         sub-line 1.1
+         sub-line 1.3
+         sub-line 1.2
+        dns server 1.1.1.2
+        """
+    ).strip()
+    target_config = dedent(
+        """
+        dns server 1.1.1.1
+        section 1
+         sub-line 1.1
+         sub-line 1.2
+         sub-line 1.4
+         sub-line 1.3
+        dns server 1.1.1.2
+        dns server 1.1.1.3
+        """
+    ).strip()
+    parser = CTreeParser(Vendor.HUAWEI)
+    current = parser.parse(current_config)
+    target = parser.parse(target_config)
+    diff = CTreeDiffer.diff(current, target, ordered_sections=[".*"], ordered_mode="lcs", reorder_root=False)
+    assert diff.config == dedent(
+        """
+        undo dns server 1.1.1.3
+        #
+        section 1
+         undo sub-line 1.3
+         sub-line 1.4
+         sub-line 1.3
+        #
+        dns server 1.1.1.3
+        #
+        """
+    ).strip()
+
+
+def test_lcs_lines() -> None:
+    assert CTreeDiffer._lcs_lines([], ["a"]) == set()
+    assert CTreeDiffer._lcs_lines(list("abcdef"), list("xaczdyf")) == {"a", "c", "d", "f"}
+    assert CTreeDiffer._lcs_lines(list("fedcba"), list("abcdef")) in [{c} for c in "abcdef"]
+    assert CTreeDiffer._lcs_lines(list("bdca"), list("abcd")) == {"b", "c"}
+
+
+def test_section_rules() -> None:
+    rules = _SectionRules([r"section \d+", r"section \d+ / sub-section \d+"], [r"route-policy \S+"])
+    assert rules.ordered("section 1")
+    assert rules.ordered("section 1 / sub-section 2")
+    assert not rules.ordered("section 1 / line")
+    assert rules.no_diff("section 1 / route-policy RP")
+    assert not rules.no_diff("section 1")
+    assert "section 1" in rules._memo
+
+    # no_diff_sections поддерживается только списком, как и раньше
+    rules = _SectionRules(None, ("route-policy",))  # type: ignore[arg-type]
+    assert not rules.ordered("section 1")
+    assert not rules.no_diff("route-policy RP")
+    assert len(rules._memo) == 0
@@ -361,6 +361,45 @@ def test_merge() -> None:
     root1.merge(root2)
     assert root1.config == config
 
+    # перенос узлов вместо копирования
+    root1 = HuaweiCT()
+    intf = HuaweiCT("interface gi0/0/0", root1)
+    _ = HuaweiCT(" ip address 1.1.1.1 255.255.255.252", intf)
+    root_hash = root1.node_hash
+    root2 = HuaweiCT()
+    intf = HuaweiCT("interface gi0/0/0", root2)
+    undo = HuaweiCT(" undo shutdown", intf)
+    ntp = HuaweiCT("ntp-service unicast-server 1.2.3.4", root2)
+    root1.merge(root2, move=True)
+    assert root1.children["interface gi0/0/0"].children["undo shutdown"] is undo
+    assert root1.children["ntp-service unicast-server 1.2.3.4"] is ntp
+    assert undo.parent is root1.children["interface gi0/0/0"]
+    assert ntp.parent is root1
+    assert "ntp-service unicast-server 1.2.3.4" not in root2.children
+    assert root1.node_hash != root_hash
+    assert root1.config == dedent(
+        """
+        interface gi0/0/0
+         ip address 1.1.1.1 255.255.255.252
+         undo shutdown
+        #
+        ntp-service unicast-server 1.2.3.4
+        #
+        """
+    ).strip()
+
+    # перенос в лист уплотненного дерева
+    root1 = HuaweiCT()
+    intf = HuaweiCT("interface gi0", root1)
+    root1.compact()
+    root2 = HuaweiCT()
+    shutdown = HuaweiCT(" shutdown", HuaweiCT("interface gi0", root2))
+    root1.merge(root2, move=True)
+    assert intf.children["shutdown"] is shutdown
+    assert shutdown.parent is intf
+    assert len(root2.children["interface gi0"].children) == 0
+    assert root1.config == "interface gi0\n shutdown\n#"
+
 
 def test_delete(huawei_manual_config: dict[str, HuaweiCT]) -> None:
     config = dedent(
@@ -517,6 +556,24 @@ def test_formal_config(huawei_manual_config: dict[str, HuaweiCT]) -> None:
     assert ip.formal_config == "interface gi0/0/0 / ip address 1.1.1.1 255.255.255.252"
 
 
+def test_formal_path(huawei_manual_config: dict[str, HuaweiCT]) -> None:
+    root = huawei_manual_config["root"]
+    intf = huawei_manual_config["intf_000"]
+    ip = huawei_manual_config["ip_000"]
+    assert root.formal_path == ""
+    assert ip.formal_path == "interface gi0/0/0 / ip address 1.1.1.1 255.255.255.252"
+    # путь кешируется и сбрасывается у потомков при изменении строки
+    assert ip._formal_path is ip._formal_path
+    intf.line = "interface gi0/0/2"
+    assert ip.formal_path == "interface gi0/0/2 / ip address 1.1.1.1 255.255.255.252"
+
+    # и при переносе узла в другую секцию
+    intf_001 = huawei_manual_config["intf_001"]
+    ip.parent = intf_001
+    assert ip.formal_path == "interface gi0/0/1 / ip address 1.1.1.1 255.255.255.252"
+    assert hash(ip) == hash(intf_001.children["ip address 1.1.1.1 255.255.255.252"])
+
+
 def test_reorder() -> None:
     config = dedent(
         """
@@ -0,0 +1,186 @@
+import pickle
+from pathlib import Path
+from textwrap import dedent
+
+import pytest
+
+from ctreepo import CTreeDiffer, CTreeEnv, CTreeSerializer, DiffCache, ParseCache, Vendor
+from ctreepo.models import CacheInfo
+
+config = dedent(
+    """
+    interface gi0/0/0
+     description test
+     ip address 1.1.1.1 255.255.255.252
+    #
+    interface gi0/0/1
+     ip address 1.1.1.2 255.255.255.252
+    #
+    ntp-service unicast-server 1.2.3.4
+    #
+    """
+).strip()
+
+tagging_rules: list[dict[str, str | list[str]]] = [
+    {"regex": r"^interface (\S+)$", "tags": ["interface"]},
+]
+
+
+def test_parse_cache() -> None:
+    cache = ParseCache(maxsize=2)
+    env = CTreeEnv(Vendor.HUAWEI, tagging_rules=tagging_rules, parse_cache=cache)
+    root = env.parse(config)
+    assert env.cache_info() == CacheInfo(hits=0, disk_hits=0, misses=1, size=1, maxsize=2)
+
+    cached = env.parse(config)
+    assert env.cache_info() == CacheInfo(hits=1, disk_hits=0, misses=1, size=1, maxsize=2)
+    assert cached is not root
+    assert CTreeSerializer.to_dict(cached) == CTreeSerializer.to_dict(root)
+
+    # изменение полученного дерева не затрагивает кеш
+    intf = cached.children["interface gi0/0/0"]
+    intf.tags.append("changed")
+    intf.children["description test"].delete()
+    assert CTreeSerializer.to_dict(env.parse(config)) == CTreeSerializer.to_dict(root)
+
+    # другой шаблон - другой ключ
+    template = env.parse("interface \\S+\n description (?P<DESCRIPTION>.*)\n#")
+    with_template = env.parse(config, template)
+    assert with_template.children["interface gi0/0/0"].children["description test"].template != ""
+    assert env.cache_info() == CacheInfo(hits=2, disk_hits=0, misses=3, size=2, maxsize=2)
+
+    # вытеснение самого старого элемента
+    _ = env.parse(config.replace("1.2.3.4", "4.3.2.1"))
+    _ = env.parse(config)
+    assert env.cache_info() == CacheInfo(hits=2, disk_hits=0, misses=5, size=2, maxsize=2)
+
+    cache.clear()
+    assert cache.info() == CacheInfo(hits=0, disk_hits=0, misses=0, size=0, maxsize=2)
+    assert CTreeEnv(Vendor.HUAWEI).cache_info() is None
+
+
+def test_parse_cache_key() -> None:
+    key = ParseCache.key(Vendor.HUAWEI, config)
+    assert key == ParseCache.key(Vendor.HUAWEI, config)
+    assert key != ParseCache.key(Vendor.CISCO, config)
+    assert key != ParseCache.key(Vendor.HUAWEI, config, template_digest="template")
+    assert key != ParseCache.key(Vendor.HUAWEI, config, rules_digest="rules")
+
+    # правила тегов входят в ключ
+    cache = ParseCache()
+    plain = CTreeEnv(Vendor.HUAWEI, parse_cache=cache).parse(config)
+    tagged = CTreeEnv(Vendor.HUAWEI, tagging_rules=tagging_rules, parse_cache=cache).parse(config)
+    assert plain.children["interface gi0/0/0"].tags == []
+    assert tagged.children["interface gi0/0/0"].tags == ["interface", "gi0/0/0"]
+    assert cache.info().misses == 2
+
+    with pytest.raises(ValueError):
+        _ = ParseCache(maxsize=0)
+
+
+def test_parse_cache_disk(tmp_path: Path) -> None:
+    directory = tmp_path / "cache"
+    env = CTreeEnv(Vendor.HUAWEI, tagging_rules=tagging_rules, parse_cache=ParseCache(directory=directory))
+    root = env.parse(config)
+    assert len(list(directory.glob("*.json"))) == 1
+
+    # новый процесс (новый кеш в памяти) берет дерево с диска
+    cache = ParseCache(directory=directory)
+    env = CTreeEnv(Vendor.HUAWEI, tagging_rules=tagging_rules, parse_cache=cache)
+    restored = env.parse(config)
+    assert CTreeSerializer.to_dict(restored) == CTreeSerializer.to_dict(root)
+    assert cache.info() == CacheInfo(hits=0, disk_hits=1, misses=0, size=1, maxsize=1024)
+    _ = env.parse(config)
+    assert cache.info() == CacheInfo(hits=1, disk_hits=1, misses=0, size=1, maxsize=1024)
+
+
+def test_diff_cache() -> None:
+    target = dedent(
+        """
+        interface gi0/0/0
+         description new
+         ip address 1.1.1.1 255.255.255.252
+        #
+        interface gi0/0/1
+         ip address 1.1.1.2 255.255.255.252
+         mtu 9000
+        #
+        ntp-service unicast-server 1.2.3.4
+        #
+        """
+    ).strip()
+    cache = DiffCache(maxsize=16)
+    env = CTreeEnv(Vendor.HUAWEI, tagging_rules=tagging_rules, diff_cache=cache)
+    expected = CTreeEnv(Vendor.HUAWEI, tagging_rules=tagging_rules).diff(env.parse(config), env.parse(target))
+
+    # по две записи (удаление и добавление) на каждую измененную секцию
+    diff = env.diff(env.parse(config), env.parse(target))
+    assert CTreeSerializer.to_dict(diff) == CTreeSerializer.to_dict(expected)
+    assert env.diff_cache_info() == CacheInfo(hits=0, disk_hits=0, misses=4, size=4, maxsize=16)
+
+    # другое устройство с теми же секциями
+    diff = env.diff(env.parse(config), env.parse(target))
+    assert CTreeSerializer.to_dict(diff) == CTreeSerializer.to_dict(expected)
+    assert env.diff_cache_info() == CacheInfo(hits=4, disk_hits=0, misses=4, size=4, maxsize=16)
+
+    # изменение полученной разницы не затрагивает кеш
+    diff.children["interface gi0/0/0"].tags.append("changed")
+    diff.children["interface gi0/0/1"].children["mtu 9000"].delete()
+    diff = env.diff(env.parse(config), env.parse(target))
+    assert CTreeSerializer.to_dict(diff) == CTreeSerializer.to_dict(expected)
+
+    # параметры вычисления входят в ключ
+    current, target_root = env.parse(config), env.parse(target)
+    ordered = CTreeDiffer.diff(current, target_root, ordered_sections=[r"interface \S+"], diff_cache=cache)
+    assert ordered == CTreeDiffer.diff(current, target_root, ordered_sections=[r"interface \S+"])
+    assert cache.info().misses == 8
+
+    # в процесс пула передается только размер кеша
+    restored = pickle.loads(pickle.dumps(env))  # noqa: S301
+    assert restored.diff_cache_info() == CacheInfo(hits=0, disk_hits=0, misses=0, size=0, maxsize=16)
+    assert CTreeEnv(Vendor.HUAWEI).diff_cache_info() is None
+
+    # вытеснение самой старой секции
+    cache = DiffCache(maxsize=1)
+    _ = CTreeDiffer.diff(current, target_root, diff_cache=cache)
+    assert cache.info() == CacheInfo(hits=0, disk_hits=0, misses=4, size=1, maxsize=1)
+
+    cache.clear()
+    assert cache.info() == CacheInfo(hits=0, disk_hits=0, misses=0, size=0, maxsize=1)
+    with pytest.raises(ValueError):
+        _ = DiffCache(maxsize=0)
+
+
+def test_diff_cache_shared() -> None:
+    target = config.replace("description test", "description new")
+    cache = DiffCache()
+    rules: dict[str, list[dict[str, str | list[str]]]] = {
+        "interface": [{"regex": r"^interface (\S+)$", "tags": ["interface"]}],
+        "port": [{"regex": r"^interface (\S+)$", "tags": ["port"]}],
+    }
+    interface_env = CTreeEnv(Vendor.HUAWEI, tagging_rules=rules["interface"], diff_cache=cache)
+    port_env = CTreeEnv(Vendor.HUAWEI, tagging_rules=rules["port"], diff_cache=cache)
+    template_env = CTreeEnv(
+        Vendor.HUAWEI,
+        tagging_rules=rules["port"],
+        template="interface \\S+\n description (?P<DESCRIPTION>.*) UNDO>> undo description\n#",
+        diff_cache=cache,
+    )
+
+    # общий кеш, но теги и шаблоны у каждого окружения свои
+    results = {}
+    for name, env, tag in (
+        ("interface", interface_env, "interface"),
+        ("port", port_env, "port"),
+        ("template", template_env, "port"),
+    ):
+        diff = env.diff(env.parse(config), env.parse(target))
+        results[name] = CTreeSerializer.to_dict(diff)
+        assert diff.children["interface gi0/0/0"].tags == [tag, "gi0/0/0"]
+    assert cache.info().hits == 0
+    assert cache.info().misses == 6
+    assert results["template"] != results["port"]
+
+    diff = port_env.diff(port_env.parse(config), port_env.parse(target))
+    assert CTreeSerializer.to_dict(diff) == results["port"]
+    assert cache.info().hits == 2
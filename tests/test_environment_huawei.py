@@ -1,9 +1,11 @@
+import pickle
 from textwrap import dedent
 from typing import cast
 
 import pytest
 
-from ctreepo import CTreeEnv, Vendor
+from ctreepo import CTree, CTreeEnv, CTreeSerializer, Vendor, environment
+from ctreepo.postproc import _REGISTRY
 from ctreepo.vendors import HuaweiCT
 
 
@@ -2479,3 +2481,78 @@ def test_diff(env_root: tuple[CTreeEnv, HuaweiCT]) -> None:
     diff_no_diff = env_no_diff.diff(a=current, b=target)
     assert diff.config == diff_str_raw
     assert diff_no_diff.config == diff_str_no_diff_section
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_diff_many(env_root: tuple[CTreeEnv, HuaweiCT], workers: int) -> None:
+    env, current = env_root
+    targets = {
+        "device-1": current.config.replace("port link-type trunk", "port link-type access"),
+        "device-2": current.config.replace("vxlan vni 5678", "vxlan vni 1234"),
+        "device-3": current.config,
+    }
+    pairs: list[tuple[str, str | CTree, str | CTree]] = [
+        (key, current.config, target) for key, target in targets.items()
+    ]
+    # деревья и строки можно смешивать
+    pairs.append(("device-4", current, env.parse(targets["device-1"])))
+
+    result = dict(env.diff_many(pairs, workers=workers, masked=True))
+    assert result.keys() == {"device-1", "device-2", "device-3", "device-4"}
+    for key, a, b in pairs:
+        expected = env.diff(env._load(a), env._load(b), masked=True)
+        assert result[key] == expected
+        assert result[key].config == expected.config
+        assert CTreeSerializer.to_dict(result[key]) == CTreeSerializer.to_dict(expected)
+    assert result["device-3"].config == ""
+    assert result["device-4"].config == result["device-1"].config
+
+
+def test_diff_many_sections(env_root: tuple[CTreeEnv, HuaweiCT]) -> None:
+    _, current = env_root
+    target = current.config.replace(
+        "vpn-target 100:5678 export-extcommunity evpn", "vpn-target 1:1 export-extcommunity evpn"
+    )
+    env = CTreeEnv(
+        vendor=Vendor.HUAWEI,
+        ordered_sections=[r"^xpl \S+ \S+$"],
+        no_diff_sections=[r"^ip vpn-instance \S+$"],
+        post_proc_rules=[],
+        template="interface \\S+\n port link-type (?P<TYPE>\\S+)\n#",
+    )
+    expected = env.diff(env.parse(current.config), env.parse(target), reorder_root=False)
+    [(key, diff)] = list(env.diff_many([(0, current.config, target)], workers=2, reorder_root=False))
+    assert key == 0
+    assert diff.config == expected.config
+    assert "ip vpn-instance LAN" in diff.children
+
+
+def test_env_pickle(env_root: tuple[CTreeEnv, HuaweiCT]) -> None:
+    env, current = env_root
+    env._template = env.parse("interface \\S+\n port link-type (?P<TYPE>\\S+)\n#")
+    restored = pickle.loads(pickle.dumps(env))  # noqa: S301
+    assert restored.vendor == env.vendor
+    assert restored._parser.tagging_rules == env._parser.tagging_rules
+    assert restored._template == env._template
+    assert restored._post_proc_rules == _REGISTRY[Vendor.HUAWEI]
+    assert CTreeSerializer.to_dict(restored.parse(current.config)) == CTreeSerializer.to_dict(env.parse(current.config))
+
+    env._template = None
+    env._post_proc_rules = []
+    restored = pickle.loads(pickle.dumps(env))  # noqa: S301
+    assert restored._template is None
+    assert restored._post_proc_rules == []
+
+
+def test_diff_many_worker(env_root: tuple[CTreeEnv, HuaweiCT], monkeypatch: pytest.MonkeyPatch) -> None:
+    # функции процесса пула проверяем в текущем процессе
+    env, current = env_root
+    monkeypatch.setattr(environment, "_worker_state", None)
+    item = ("device", current.config, CTreeSerializer.to_records(current))
+    with pytest.raises(RuntimeError):
+        _ = environment._diff_many_task(item)
+
+    environment._diff_many_init(env, False, True)
+    key, records = environment._diff_many_task(item)
+    assert key == "device"
+    assert CTreeSerializer.from_records(Vendor.HUAWEI, records).config == ""
@@ -0,0 +1,86 @@
+from textwrap import dedent
+
+from ctreepo import CTreeEnv, CTreeMetrics, CTreeParser, Vendor
+from ctreepo.metrics import collect, current, stage
+
+current_config = dedent(
+    """
+    interface gi0/0/0
+     description old
+     port link-type trunk
+    #
+    ntp-service unicast-server 1.2.3.4
+    #
+    """
+).strip()
+
+target_config = dedent(
+    """
+    interface gi0/0/0
+     description new
+     port link-type access
+    #
+    ntp-service unicast-server 4.3.2.1
+    #
+    """
+).strip()
+
+tagging_rules: list[dict[str, str | list[str]]] = [
+    {"regex": r"^interface (\S+)$", "tags": ["interface"]},
+]
+
+
+def test_instrument() -> None:
+    env = CTreeEnv(
+        Vendor.HUAWEI,
+        tagging_rules=tagging_rules,
+        template="interface \\S+\n description (?P<DESCRIPTION>.*)\n#",
+    )
+    with env.instrument() as metrics:
+        current_root = env.parse(current_config)
+        target_root = env.parse(target_config)
+        _ = env.diff(current_root, target_root)
+
+    data = metrics.to_dict()
+    assert data["parse.pre_run"]["count"] == 2
+    assert data["parse.post_run"]["count"] == 2
+    assert data["parse.lines"]["count"] == 8
+    assert data["parse.template"]["count"] == 8
+    assert data["parse.tagging"]["count"] == 8
+    for name in ("diff.hashing", "diff.negative", "diff.positive", "diff.template_dedup"):
+        assert data[name]["count"] == 1
+        assert data[name]["time"] >= 0
+    # вызываются только правила, секции которых есть в diff
+    assert data["postproc.HuaweiPostProcInterface"]["count"] == 1
+    assert data["postproc.DeleteNoValue"]["count"] == 1
+    assert "postproc.HuaweiPostProcBGP" not in data
+
+    # вне блока with метрики не собираются
+    _ = env.parse(current_config)
+    assert metrics.to_dict()["parse.pre_run"]["count"] == 2
+    assert current() is None
+
+
+def test_metrics() -> None:
+    # общий сборщик на несколько блоков, без тегов этап parse.tagging не пишется
+    metrics = CTreeMetrics()
+    parser = CTreeParser(Vendor.HUAWEI)
+    with collect(metrics) as collected:
+        assert collected is metrics
+        _ = parser.parse(current_config)
+    with collect(metrics):
+        _ = parser.parse_stream(current_config.splitlines())
+        with stage("custom"):
+            pass
+    data = metrics.to_dict()
+    assert data["parse.lines"]["count"] == 8
+    assert data["parse.post_run"]["count"] == 2
+    assert data["custom"]["count"] == 1
+    assert "parse.tagging" not in data
+
+    with stage("custom"):
+        pass
+    assert metrics.to_dict()["custom"]["count"] == 1
+
+    metrics.clear()
+    assert metrics.to_dict() == {}
@@ -0,0 +1,12 @@
+from ctreepo.parallel import pool_map
+
+
+def test_pool_map() -> None:
+    assert sorted(pool_map(abs, range(-10, 0), workers=2, max_pending=1)) == list(range(1, 11))
+
+
+def test_pool_map_break() -> None:
+    # досрочный выход из итерации не должен зависать на оставшихся задачах
+    for result in pool_map(abs, range(-1000, 0), workers=2):
+        assert result > 0
+        break
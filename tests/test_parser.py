@@ -1,9 +1,12 @@
+import copy
+import pickle
 from pathlib import Path
 from textwrap import dedent
 
 import pytest
 
-from ctreepo import CTreeParser, Vendor
+from ctreepo import CTreeDiffer, CTreeEnv, CTreeParser, CTreeSerializer, ParseCache, Vendor
+from ctreepo import parser as parser_module
 from ctreepo.models import TaggingRule
 from ctreepo.parser import TaggingRules, TaggingRulesDict, TaggingRulesFile
 
@@ -295,3 +298,218 @@ def test_repeated_section() -> None:
     parser = CTreeParser(Vendor.HUAWEI)
     root = parser.parse(config)
     assert root.config == target_config
+
+
+def test_template_index() -> None:
+    template_config = dedent(
+        r"""
+        interface \S+
+         (description) (?P<DESCRIPTION>.*) UNDO>> undo \1
+         description fixed
+         ip mtu (?P<MTU>\d+)
+        #
+        interface Vlanif\d+
+         ip address \S+ \S+
+        #
+        (?:ntp|sntp) server (?P<IP>\S+)
+        #
+        """
+    ).strip()
+    config = dedent(
+        """
+        interface Vlanif1
+         description fixed
+         ip mtu 1500
+        #
+        ntp server 1.2.3.4
+        #
+        sntp server 1.2.3.4
+        #
+        snmp-agent
+        #
+        """
+    ).strip()
+    parser = CTreeParser(Vendor.HUAWEI)
+    template = parser.parse(template_config)
+    root = parser.parse(config, template)
+    vlanif = root.children["interface Vlanif1"]
+    # порядок шаблонов сохраняется: regex-шаблон идет раньше литерального
+    assert vlanif.children["description fixed"].template == "description (?P<DESCRIPTION>.*)"
+    assert vlanif.children["ip mtu 1500"].template == r"ip mtu (?P<MTU>\d+)"
+    assert root.children["ntp server 1.2.3.4"].template == r"ntp server (?P<IP>\S+)"
+    assert root.children["sntp server 1.2.3.4"].template == r"sntp server (?P<IP>\S+)"
+    assert root.children["snmp-agent"].template == ""
+
+    # индекс переиспользуется для того же шаблона
+    index = parser._get_template_index(template)
+    assert parser._get_template_index(template) is index
+
+    # и перестраивается, если шаблон изменился
+    template.children[r"(?:ntp|sntp) server (?P<IP>\S+)"].line = r"(?P<SNMP>snmp-agent)"
+    template.rebuild()
+    assert parser._get_template_index(template) is not index
+    root = parser.parse(config, template)
+    assert root.children["ntp server 1.2.3.4"].template == ""
+    assert root.children["snmp-agent"].template == "(?P<SNMP>snmp-agent)"
+
+
+def test_tagging_rules_order() -> None:
+    config = dedent(
+        """
+        interface gi0/0/0
+         description uplink
+        #
+        interface gi0/0/1
+         description downlink
+        #
+        ntp-service unicast-server 1.2.3.4
+        #
+        """
+    ).strip()
+    rules = TaggingRulesDict(
+        {
+            Vendor.HUAWEI: [
+                {"regex": r"^interface (gi0/0/0)$", "tags": ["first"]},
+                {"regex": r"uplink$", "tags": ["uplink"]},
+                {"regex": r"^interface (\S+) / description", "tags": ["description"]},
+                {"regex": r"^interface", "tags": ["interface"]},
+                {"regex": r"^(?:ntp|sntp)-service", "tags": ["ntp"]},
+            ],
+        },
+    )
+    parser = CTreeParser(Vendor.HUAWEI, rules)
+    root = parser.parse(config)
+    intf_0 = root.children["interface gi0/0/0"]
+    intf_1 = root.children["interface gi0/0/1"]
+    assert intf_0.tags == ["first", "gi0/0/0"]
+    assert intf_1.tags == ["interface"]
+    assert intf_0.children["description uplink"].tags == ["uplink"]
+    assert intf_1.children["description downlink"].tags == ["description", "gi0/0/1"]
+    assert root.children["ntp-service unicast-server 1.2.3.4"].tags == ["ntp"]
+
+    parser.tagging_rules = [TaggingRule(regex=r"^ntp-service unicast-server (\S+)", tags=["ntp"])]
+    root = parser.parse(config)
+    assert root.children["interface gi0/0/0"].tags == []
+    assert root.children["ntp-service unicast-server 1.2.3.4"].tags == ["ntp", "1.2.3.4"]
+
+
+def test_parse_stream(tmp_path: Path) -> None:
+    parser = CTreeParser(Vendor.ARISTA)
+    filename = tmp_path / "config.txt"
+    filename.write_text(arista_config + "\r\n")
+    root = parser.parse_stream(filename)
+    assert root.config == arista_config
+    root = parser.parse_stream(iter(arista_config.splitlines()))
+    assert root.config == arista_config
+
+    env = CTreeEnv(Vendor.ARISTA)
+    with open(filename, "r") as f:
+        assert env.parse_stream(f).config == arista_config
+
+    with pytest.raises(TypeError):
+        parser.parse_stream(arista_config)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_parse_many(get_dict_loader: TaggingRules, workers: int) -> None:
+    parser = CTreeParser(Vendor.HUAWEI, tagging_rules=get_dict_loader)
+    template = parser.parse("interface \\S+\n (description) (?P<DESCRIPTION>.*) UNDO>> undo \\1\n#")
+    configs = {f"device-{i}": huawei_config.replace("description test", f"description {i}") for i in range(5)}
+
+    result = dict(parser.parse_many(configs.items(), template=template, workers=workers))
+    assert result.keys() == configs.keys()
+    for key, root in result.items():
+        expected = parser.parse(configs[key], template)
+        assert root == expected
+        assert root.config == expected.config
+        assert root.node_hash == expected.node_hash
+        intf = root.children["interface gi0/0/0"]
+        assert intf.tags == ["interface", "gi0/0/0"]
+        assert intf.children["ip address 1.1.1.1 255.255.255.252"].tags == ["ip", "interface-1", "gi0/0/0"]
+        description = intf.children[key.replace("device-", "description ")]
+        assert description.template == "description (?P<DESCRIPTION>.*)"
+        assert description.undo_line == "undo description"
+
+
+def test_parse_many_env() -> None:
+    env = CTreeEnv(Vendor.ARISTA, template="interface \\S+\n   description (?P<DESCRIPTION>.*)\n!")
+    configs = ((i, arista_config) for i in range(10))
+    result = list(env.parse_many(configs, workers=2))
+    assert sorted(key for key, _ in result) == list(range(10))
+    root = result[0][1]
+    assert root == env.parse(arista_config)
+    assert root.children["interface gi0/0/0"].children["description test"].template == "description (?P<DESCRIPTION>.*)"
+
+    # без шаблона
+    env = CTreeEnv(Vendor.ARISTA)
+    assert list(env.parse_many([("device", arista_config)], workers=1)) == [("device", env.parse(arista_config))]
+
+    # без конфигураций пул ничего не возвращает
+    assert list(env.parse_many([], workers=2)) == []
+
+
+def test_parse_many_worker(monkeypatch: pytest.MonkeyPatch) -> None:
+    # функции процесса пула проверяем в текущем процессе
+    monkeypatch.setattr(parser_module, "_worker_state", None)
+    with pytest.raises(RuntimeError):
+        _ = parser_module._parse_many_task(("device", arista_config))
+
+    template = CTreeParser(Vendor.ARISTA).parse("interface \\S+\n   description (?P<DESCRIPTION>.*)\n!")
+    rules = [TaggingRule(regex=r"^interface (\S+)$", tags=["interface"])]
+    parser_module._parse_many_init(Vendor.ARISTA, rules, CTreeSerializer.to_records(template))
+    key, records = parser_module._parse_many_task(("device", arista_config))
+    assert key == "device"
+    root = CTreeSerializer.from_records(Vendor.ARISTA, records)
+    intf = root.children["interface gi0/0/0"]
+    assert intf.tags == ["interface", "gi0/0/0"]
+    assert intf.children["description test"].template == "description (?P<DESCRIPTION>.*)"
+
+
+def test_compact(get_dict_loader: TaggingRules) -> None:
+    parser = CTreeParser(Vendor.HUAWEI, tagging_rules=get_dict_loader)
+    compact_parser = CTreeParser(Vendor.HUAWEI, tagging_rules=get_dict_loader, compact=True)
+    expected = parser.parse(huawei_config)
+    root = compact_parser.parse(huawei_config)
+    assert root == expected
+    assert root.node_hash == expected.node_hash
+    assert CTreeSerializer.to_dict(root) == CTreeSerializer.to_dict(expected)
+    assert compact_parser.parse_stream(iter(huawei_config.splitlines())) == expected
+
+    # одинаковые строки и списки тегов хранятся в одном экземпляре
+    lan = root.children["ip vpn-instance LAN"].children["ipv4-family"]
+    mgmt = root.children["ip vpn-instance MGMT"].children["ipv4-family"]
+    assert lan.line is mgmt.line
+    assert lan.tags is root.children["ip vpn-instance LAN"].children["vxlan vni 123"].tags
+    assert next(iter(lan.children)) is lan.children["route-distinguisher 192.168.0.1:123"].line
+
+    # у листьев общий словарь потомков только для чтения
+    leaf = root.children["storm suppression statistics enable"]
+    no_children = leaf.children
+    assert no_children is lan.children["vpn-target 123:123 import-extcommunity evpn"].children
+    with pytest.raises(TypeError, match="read-only"):
+        leaf.children["test"] = leaf
+    with pytest.raises(TypeError, match="read-only"):
+        leaf.children.update({"test": leaf})
+
+    # уплотненное дерево передается через pickle и копируется, листья остаются общими
+    for restored in (pickle.loads(pickle.dumps(root)), copy.deepcopy(root)):  # noqa: S301
+        assert restored == expected
+        assert restored.config == expected.config
+        assert restored.children["storm suppression statistics enable"].children is no_children
+    child = leaf.__class__("test", parent=leaf)
+    assert leaf.children == {"test": child}
+    assert lan.children["vpn-target 123:123 import-extcommunity evpn"].children == {}
+    assert root != expected
+
+    target = huawei_config.replace("123", "1")
+    diff = CTreeDiffer.diff(compact_parser.parse(huawei_config), compact_parser.parse(target))
+    assert diff.config == CTreeDiffer.diff(expected, parser.parse(target)).config
+
+    # parse_many (в том числе через пул), кеш разбора и передача парсера в другой процесс
+    for _, tree in compact_parser.parse_many([("device", huawei_config)], workers=2):
+        assert tree == expected
+        assert tree.children["sflow collector 1 ip 100.64.0.1 vpn-instance MGMT"].children is no_children
+    assert pickle.loads(pickle.dumps(compact_parser)).compact is True  # noqa: S301
+    env = CTreeEnv(Vendor.HUAWEI, parse_cache=ParseCache(), compact=True)
+    _ = env.parse(huawei_config)
+    assert env.parse(huawei_config).children["storm suppression statistics enable"].children is no_children
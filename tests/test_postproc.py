@@ -0,0 +1,76 @@
+import re
+from textwrap import dedent
+
+import pytest
+
+from ctreepo import CTree, CTreeParser, CTreeSerializer, Vendor
+from ctreepo.postproc import _REGISTRY, CTreePostProc, process_rules
+
+diff_config = dedent(
+    """
+    undo ntp-service unicast-server 1.2.3.4
+    #
+    ntp-service unicast-server 4.3.2.1
+    #
+    interface gi0/0/0
+     description new
+    #
+    """
+).strip()
+
+
+class _Rename(CTreePostProc):
+    sections = ("interface ",)
+
+    @classmethod
+    def process(cls, ct: CTree) -> None:
+        node = ct.children["interface gi0/0/0"]
+        node.line = "Interface gi0/0/0"
+        ct.rebuild()
+
+
+class _Regex(CTreePostProc):
+    sections: tuple[str | re.Pattern[str], ...] = (re.compile(r"interface gi\S+"),)
+
+    @classmethod
+    def process(cls, ct: CTree) -> None:
+        _ = ct.__class__(cls.__name__, ct)
+
+
+class _RegexIgnoreCase(_Regex):
+    sections = (re.compile(r"interface gi\S+", flags=re.IGNORECASE),)
+
+
+class _Always(_Regex):
+    sections = ()
+
+
+@pytest.mark.parametrize(
+    "vendor",
+    [Vendor.ARISTA, Vendor.CISCO, Vendor.HUAWEI],
+)
+def test_rules_without_sections(vendor: Vendor) -> None:
+    # правила безопасно вызывать напрямую для diff без их секций, отбор по sections - только оптимизация
+    root = CTreeParser(vendor).parse("ntp server 1.2.3.4\nsnmp-server location dc\nsnmp-agent sys-info location dc")
+    expected = CTreeSerializer.to_dict(root)
+    for rule in _REGISTRY[vendor]:
+        rule.process(root)
+    assert CTreeSerializer.to_dict(root) == expected
+
+
+def test_process_rules() -> None:
+    root = CTreeParser(Vendor.HUAWEI).parse(diff_config)
+
+    # после переименования секции ее уже нет, индекс перестраивается
+    process_rules(root, [_Rename, _Regex, _RegexIgnoreCase, _Always])
+    assert list(root.children) == [
+        "undo ntp-service unicast-server 1.2.3.4",
+        "ntp-service unicast-server 4.3.2.1",
+        "Interface gi0/0/0",
+        "_RegexIgnoreCase",
+        "_Always",
+    ]
+
+    root = CTreeParser(Vendor.HUAWEI).parse(diff_config)
+    process_rules(root, [_Regex])
+    assert "_Regex" in root.children
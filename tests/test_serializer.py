@@ -216,3 +216,65 @@ def test_from_dict(get_dict_loader: TaggingRules) -> None:
 
     root_from_dict = CTreeSerializer.from_dict(Vendor.HUAWEI, config_dict)
     assert root_from_config == root_from_dict
+
+
+def test_to_dict_node_hash() -> None:
+    parser = CTreeParser(vendor=Vendor.HUAWEI)
+    root = parser.parse(config)
+    serialized_config = CTreeSerializer.to_dict(root, node_hash=True)
+    assert serialized_config["node_hash"] == root.node_hash
+    intf = serialized_config["children"]["interface gi0/0/0"]
+    assert intf["node_hash"] == root.children["interface gi0/0/0"].node_hash
+
+
+def test_from_dict_trust_hash() -> None:
+    parser = CTreeParser(vendor=Vendor.HUAWEI)
+    root = parser.parse(config)
+    data = CTreeSerializer.to_dict(root, node_hash=True)
+
+    # не доверяем - хеши не загружаются, считаются при обращении
+    loaded = CTreeSerializer.from_dict(Vendor.HUAWEI, data)
+    assert loaded._node_hash == ""
+    assert loaded.node_hash == root.node_hash
+
+    # доверяем - берем хеш из словаря без вычисления
+    data["node_hash"] = "stored-hash"
+    loaded = CTreeSerializer.from_dict(Vendor.HUAWEI, data, trust_hash=True)
+    assert loaded.node_hash == "stored-hash"
+    intf = loaded.children["interface gi0/0/0"]
+    assert intf._node_hash == root.children["interface gi0/0/0"].node_hash
+
+    # словарь без хешей - считаем при обращении
+    loaded = CTreeSerializer.from_dict(Vendor.HUAWEI, config_dict, trust_hash=True)
+    assert loaded._node_hash == ""
+    assert loaded.node_hash == root.node_hash
+
+    # у секции нет хеша - у корня хеш тоже не берем, изменения в секции сбрасывают хеш корня
+    data = CTreeSerializer.to_dict(root, node_hash=True)
+    del data["children"]["interface gi0/0/0"]["node_hash"]
+    loaded = CTreeSerializer.from_dict(Vendor.HUAWEI, data, trust_hash=True)
+    assert loaded._node_hash == ""
+    assert loaded.children["interface gi0/0/1"]._node_hash != ""
+    ip = loaded.children["interface gi0/0/0"].children["ip address 1.1.1.1 255.255.255.252"]
+    ip.line = "ip address 2.2.2.2 255.255.255.252"
+    loaded.rebuild(deep=True)
+    fresh = CTreeSerializer.from_dict(Vendor.HUAWEI, CTreeSerializer.to_dict(loaded))
+    assert loaded.node_hash == fresh.node_hash != root.node_hash
+
+
+def test_records(get_dict_loader: TaggingRules) -> None:
+    parser = CTreeParser(vendor=Vendor.HUAWEI, tagging_rules=get_dict_loader)
+    root = parser.parse(config)
+    records = CTreeSerializer.to_records(root)
+    assert records[0] == (0, "", [], "", "")
+    assert records[1] == (1, "sflow collector 1 ip 100.64.0.1 vpn-instance MGMT", [], "", "")
+    assert records[3] == (1, "ip vpn-instance MGMT", ["vpn", "MGMT"], "", "")
+    assert records[4] == (2, "ipv4-family", ["vpn", "MGMT"], "", "")
+    assert len(records) == 1 + len(root.config.splitlines()) - root.config.count("#")
+
+    restored = CTreeSerializer.from_records(Vendor.HUAWEI, records)
+    assert restored == root
+    assert CTreeSerializer.to_dict(restored) == config_dict
+
+    with pytest.raises(ValueError):
+        _ = CTreeSerializer.from_records(Vendor.HUAWEI, [])
@@ -0,0 +1,259 @@
+import pickle
+import sys
+from pathlib import Path
+from textwrap import dedent
+from typing import Any
+
+import pytest
+
+from ctreepo import CTree, CTreeDiffer, CTreeEnv, CTreeSearcher, CTreeSerializer, CTreeSnapshot, Vendor
+from ctreepo import snapshot as snapshot_module
+
+current_config = dedent(
+    """
+    ip vpn-instance MGMT
+     ipv4-family
+      route-distinguisher 192.168.0.1:123
+    #
+    interface gi0/0/0
+     description test
+     ip address 1.1.1.1 255.255.255.252
+    #
+    interface gi0/0/1
+     ip address 1.1.1.2 255.255.255.252
+    #
+    ntp-service authentication-keyid 1 authentication-mode md5 cipher secret_password
+    #
+    xpl route-filter rp_TEST
+     approve
+    #
+    route-policy rp_DENY deny node 10
+    #
+    ip ip-prefix pl_TEST index 10 permit 10.0.0.0 8
+    ip ip-prefix pl_TEST index 20 permit 11.0.0.0 8
+    #
+    """
+).strip()
+
+target_config = dedent(
+    """
+    ip vpn-instance MGMT
+     ipv4-family
+      route-distinguisher 192.168.0.1:123
+    #
+    interface gi0/0/0
+     description new
+     ip address 1.1.1.1 255.255.255.252
+    #
+    interface gi0/0/1
+     ip address 1.1.1.2 255.255.255.252
+    #
+    ntp-service authentication-keyid 1 authentication-mode md5 cipher new_password
+    #
+    xpl route-filter rp_TEST
+     approve
+    #
+    ip ip-prefix pl_TEST index 20 permit 11.0.0.0 8
+    ip ip-prefix pl_TEST index 10 permit 10.0.0.0 8
+    #
+    """
+).strip()
+
+tagging_rules: list[dict[str, str | list[str]]] = [
+    {"regex": r"^ip vpn-instance (\S+)$", "tags": ["vpn"]},
+    {"regex": r"^interface (\S+)$", "tags": ["interface"]},
+]
+
+template = "interface \\S+\n description (?P<DESCRIPTION>.*) UNDO>> undo description\n#"
+
+
+@pytest.fixture
+def env() -> CTreeEnv:
+    return CTreeEnv(Vendor.HUAWEI, tagging_rules=tagging_rules, template=template)
+
+
+def test_snapshot(env: CTreeEnv) -> None:
+    root = env.parse(current_config)
+    snapshot = CTreeSnapshot.from_tree(root)
+    assert snapshot.vendor == Vendor.HUAWEI
+    assert len(snapshot) == 1 + len(root.config.splitlines()) - root.config.count("#")
+    assert snapshot.node_hash == root.node_hash
+    assert list(snapshot.sections())[1] == ("interface gi0/0/0", root.children["interface gi0/0/0"].node_hash)
+    for attr in ("config", "masked_config", "formal_config", "patch", "masked_patch"):
+        assert getattr(snapshot, attr) == getattr(root, attr)
+
+    restored = snapshot.thaw()
+    assert restored == root
+    assert CTreeSerializer.to_dict(restored, node_hash=True) == CTreeSerializer.to_dict(root, node_hash=True)
+    description = restored.children["interface gi0/0/0"].children["description test"]
+    assert description.undo_line == "undo description"
+    assert description.template != ""
+
+    partial = snapshot.thaw(["interface gi0/0/1", "unknown"])
+    assert list(partial.children) == ["interface gi0/0/1"]
+
+    data = snapshot.to_bytes()
+    loaded = CTreeSnapshot.from_bytes(data)
+    assert loaded.to_bytes() == data
+    assert loaded.config == root.config
+    assert loaded.thaw() == root
+    assert pickle.loads(pickle.dumps(snapshot)).to_bytes() == data  # noqa: S301
+
+    # строки не только из ascii
+    root = env.parse(current_config.replace("description test", "description тест"))
+    snapshot = CTreeSnapshot.from_tree(root)
+    assert snapshot.config == root.config
+    assert snapshot.thaw() == root
+
+    empty = CTreeSnapshot.from_tree(root.__class__())
+    assert empty.config == empty.formal_config == empty.patch == ""
+
+
+def test_snapshot_vendors() -> None:
+    configs = {
+        Vendor.CISCO: dedent(
+            """
+            crypto pki certificate chain TP
+             certificate 01
+              0102 0304
+              quit
+            !
+            router bgp 1
+             neighbor 1.1.1.1 remote-as 1
+            !
+            """
+        ).strip(),
+        Vendor.FORTINET: dedent(
+            """
+            config system global
+                set hostname "fw"
+            end
+            config firewall address
+                edit "a"
+                    set subnet 1.1.1.1 255.255.255.255
+                next
+            end
+            """
+        ).strip(),
+    }
+    for vendor, config in configs.items():
+        root = CTreeEnv(vendor).parse(config)
+        snapshot = CTreeSnapshot.from_tree(root)
+        assert snapshot.patch == root.patch
+        assert snapshot.masked_patch == root.masked_patch
+        assert CTreeSnapshot.from_bytes(snapshot.to_bytes()).thaw() == root
+
+
+def test_snapshot_errors(env: CTreeEnv, monkeypatch: pytest.MonkeyPatch) -> None:
+    root = env.parse(current_config)
+    with pytest.raises(ValueError):
+        _ = CTreeSnapshot.from_tree(root.children["interface gi0/0/0"])
+    with pytest.raises(NotImplementedError):
+        _ = CTreeSnapshot.from_tree(CTree())
+    with pytest.raises(RuntimeError):
+        _ = snapshot_module._int_array("q")
+
+    data = CTreeSnapshot.from_tree(root).to_bytes()
+    with pytest.raises(ValueError, match="too short"):
+        _ = CTreeSnapshot.from_bytes(data[:10])
+    with pytest.raises(ValueError, match="not a ctree snapshot"):
+        _ = CTreeSnapshot.from_bytes(b"XXXX" + data[4:])
+    with pytest.raises(ValueError, match="version"):
+        _ = CTreeSnapshot.from_bytes(data[:4] + b"\xff\xff" + data[6:])
+    with pytest.raises(ValueError, match="truncated"):
+        _ = CTreeSnapshot.from_bytes(data[:-1])
+    with pytest.raises(ValueError, match="truncated"):
+        _ = CTreeSnapshot.from_bytes(data[:100])
+
+    # на big-endian массивы переводятся в little-endian при записи и обратно при чтении
+    monkeypatch.setattr(sys, "byteorder", "big")
+    swapped = CTreeSnapshot.from_tree(root).to_bytes()
+    assert swapped != data
+    assert CTreeSnapshot.from_bytes(swapped).thaw() == root
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"string": "ip address"},
+        {"string": "interface", "include_children": True},
+        {"include_tags": ["interface"]},
+        {"include_tags": ["vpn", "MGMT"], "include_mode": "and", "include_children": True},
+        {"string": "address", "exclude_tags": ["gi0/0/1"]},
+        {},
+    ],
+)
+def test_snapshot_search(env: CTreeEnv, kwargs: dict[str, Any]) -> None:
+    root = env.parse(current_config)
+    snapshot = CTreeSnapshot.from_tree(root)
+    expected = CTreeSearcher.search(root, **kwargs)
+    result = CTreeSearcher.search(snapshot, **kwargs)
+    assert result == expected
+    assert CTreeSerializer.to_dict(result) == CTreeSerializer.to_dict(expected)
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {},
+        {"masked": True},
+        {"ordered_sections": [r"ip ip-prefix \S+"]},
+        {"ordered_sections": [r"^$"]},
+        {"no_diff_sections": [r"xpl route-filter \S+"]},
+    ],
+)
+def test_snapshot_diff(env: CTreeEnv, kwargs: dict[str, Any]) -> None:
+    current = env.parse(current_config)
+    target = env.parse(target_config)
+    expected = CTreeDiffer.diff(current, target, **kwargs)
+    current_snapshot = CTreeSnapshot.from_tree(current)
+    target_snapshot = CTreeSnapshot.from_tree(target)
+    pairs: list[tuple[CTree | CTreeSnapshot, CTree | CTreeSnapshot]] = [
+        (current_snapshot, target_snapshot),
+        (current, target_snapshot),
+        (current_snapshot, target),
+    ]
+    for a, b in pairs:
+        result = CTreeDiffer.diff(a, b, **kwargs)
+        assert result.patch == expected.patch
+        assert CTreeSerializer.to_dict(result) == CTreeSerializer.to_dict(expected)
+
+    # одинаковые конфигурации - разворачивать нечего
+    assert CTreeDiffer.diff(current_snapshot, CTreeSnapshot.from_tree(env.parse(current_config))).patch == ""
+
+
+def test_snapshot_file(env: CTreeEnv, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    current = env.parse(current_config)
+    target = env.parse(target_config)
+    filename = tmp_path / "current.ctsn"
+    CTreeSnapshot.from_tree(current).to_file(filename)
+    CTreeSnapshot.from_tree(target).to_file(tmp_path / "target.ctsn")
+    # временные файлы не остаются
+    assert sorted(tmp_path.iterdir()) == [filename, tmp_path / "target.ctsn"]
+
+    snapshot = CTreeSnapshot.from_file(filename)
+    assert len(snapshot) == len(CTreeSnapshot.from_tree(current))
+    assert snapshot.node_hash == current.node_hash
+    for attr in ("config", "masked_config", "formal_config", "patch", "masked_patch"):
+        assert getattr(snapshot, attr) == getattr(current, attr)
+    assert snapshot.thaw() == current
+    assert CTreeSerializer.to_dict(snapshot.thaw()) == CTreeSerializer.to_dict(current)
+    assert snapshot.to_bytes() == filename.read_bytes()
+    assert pickle.loads(pickle.dumps(snapshot)).config == current.config  # noqa: S301
+
+    search = CTreeSearcher.search(snapshot, include_tags=["interface"], include_children=True)
+    assert search == CTreeSearcher.search(current, include_tags=["interface"], include_children=True)
+    diff = CTreeDiffer.diff(snapshot, CTreeSnapshot.from_file(tmp_path / "target.ctsn"))
+    assert diff.patch == CTreeDiffer.diff(current, target).patch
+
+    filename.write_bytes(filename.read_bytes()[:-1])
+    with pytest.raises(ValueError, match="truncated"):
+        _ = CTreeSnapshot.from_file(filename)
+    filename.write_bytes(b"CTSN" + b"\0" * 100)
+    with pytest.raises(ValueError, match="version"):
+        _ = CTreeSnapshot.from_file(filename)
+
+    # на big-endian файл читается с копированием
+    monkeypatch.setattr(sys, "byteorder", "big")
+    CTreeSnapshot.from_tree(current).to_file(filename)
+    assert CTreeSnapshot.from_file(filename).thaw() == current
@@ -0,0 +1,31 @@
+import re
+
+import pytest
+
+from ctreepo.utils import literal_prefix
+
+
+@pytest.mark.parametrize(
+    "pattern, prefix",
+    [
+        (r"interface \S+", "interface "),
+        (r"ip mtu (?P<MTU>\d+)", "ip mtu "),
+        ("shutdown", "shutdown"),
+        (r"(description) ((?P<DESCRIPTION>.*))", ""),
+        (r"interfaces? \S+", "interface"),
+        (r"ab *c", "ab"),
+        (".*abc", ""),
+        ("{abc", ""),
+        (r"snmp-agent community (?:read|write) \S+", "snmp-agent community "),
+        (r"snmp-agent|ntp", ""),
+        (r"ntp (a)|(b)", ""),
+        (r"acl [|(]\S+", "acl "),
+        (r"acl []|] \S+", "acl "),
+        (r"acl [^]|] \S+", "acl "),
+        (r"acl \| \S+", "acl "),
+        (r"acl \(| \S+", ""),
+    ],
+)
+def test_literal_prefix(pattern: str, prefix: str) -> None:
+    assert literal_prefix(pattern) == prefix
+    re.compile(pattern)
@@ -1,3 +1,4 @@
+from io import StringIO
 from textwrap import dedent
 
 import pytest
@@ -1828,3 +1829,95 @@ def test_searcher(root: CTree) -> None:
     assert qos.config == qos_config
     assert interface_or_qos.config == interface_or_qos_config
     assert interface_and_qos.config == interface_and_qos_config
+
+
+def test_parse_stream(root: CTree) -> None:
+    parser = CTreeParser(Vendor.CISCO)
+    config = root.config
+    assert parser.parse_stream(StringIO(config)).config == config
+    assert parser.parse_stream(StringIO(config)) == parser.parse(config)
+
+    # однострочный баннер без пробелов перед многострочным
+    config = dedent(
+        """
+        banner motd ^Chello^C
+        banner login #
+        line1
+        #
+        banner exec $welcome$
+        """
+    ).strip()
+    stream = parser.parse_stream(StringIO(config))
+    assert stream == parser.parse(config)
+    assert list(stream.children) == list(parser.parse(config).children)
+    assert len(stream.children) == 3
+
+    # текст на первой строке баннера, разделитель - начало первого слова
+    config = dedent(
+        """
+        banner motd ^CWelcome to r1
+        Authorized only
+        ^C
+        hostname r1
+        """
+    ).strip()
+    stream = parser.parse_stream(StringIO(config))
+    assert stream == parser.parse(config)
+    assert list(stream.children) == list(parser.parse(config).children)
+    assert len(stream.children) == 2
+
+    # незакрытый баннер не мешает склеить следующие
+    config = dedent(
+        """
+        banner exec ^C
+        banner login #
+        line1
+        #
+        hostname r1
+        """
+    ).strip()
+    stream = parser.parse_stream(StringIO(config))
+    assert stream == parser.parse(config)
+    assert list(stream.children) == list(parser.parse(config).children)
+    assert len(stream.children) == 3
+
+
+def test_parse_stream_banner_max_lines(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(CiscoCT, "banner_max_lines", 2)
+    src = ["banner motd ^C", "line 1", "line 2", "banner login #", "line 3", "#", "^C"]
+    assert list(CiscoCT.pre_run_lines(src)) == [
+        "banner motd ^C",
+        "line 1",
+        "line 2",
+        "banner login #<<br>>line 3<<br>>#",
+        "^C",
+    ]
+
+
+def test_parse_stream_unterminated() -> None:
+    src = dedent(
+        """
+        crypto pki certificate chain TP_NAME_1
+         certificate ca 1234ABCD
+          30820378 30820260
+        quit
+          quit
+         certificate ca 4321DCBA
+          30820378 30820260
+        banner login ^C single line ^C
+        banner motd ^C
+        line 1
+        """
+    ).strip()
+    lines = list(CiscoCT.pre_run_lines(src.splitlines()))
+    assert lines == [
+        "crypto pki certificate chain TP_NAME_1",
+        " certificate ca 1234ABCD",
+        "  30820378 30820260<<br>>quit",
+        "  quit",
+        " certificate ca 4321DCBA",
+        "  30820378 30820260",
+        "banner login ^C single line ^C",
+        "banner motd ^C",
+        "line 1",
+    ]
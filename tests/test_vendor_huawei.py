@@ -1,3 +1,4 @@
+from io import StringIO
 from textwrap import dedent
 
 import pytest
@@ -2353,3 +2354,52 @@ def test_vty_expand() -> None:
     )
     config = HuaweiCT._expand_vty(src)
     assert config == dst
+
+
+def test_parse_stream(root: CTree) -> None:
+    parser = CTreeParser(Vendor.HUAWEI)
+    config = root.config
+    assert parser.parse_stream(StringIO(config)) == parser.parse(config)
+
+
+def test_vty_expand_lines() -> None:
+    src = dedent(
+        """
+        user-interface con 0
+         authentication-mode password
+        user-interface vty 0 2
+         authentication-mode aaa
+         idle-timeout 30 0
+        user-interface vty 10
+         authentication-mode aaa
+        #
+          ntp-service server disable
+          ntp-service source-interface LoopBack0
+        #
+        user-interface vty 16 17
+         authentication-mode aaa
+        """
+    ).strip()
+    lines = list(HuaweiCT.pre_run_lines(src.splitlines()))
+    assert lines == [
+        "user-interface con 0",
+        " authentication-mode password",
+        "user-interface vty 0",
+        " authentication-mode aaa",
+        " idle-timeout 30 0",
+        "user-interface vty 1",
+        " authentication-mode aaa",
+        " idle-timeout 30 0",
+        "user-interface vty 2",
+        " authentication-mode aaa",
+        " idle-timeout 30 0",
+        "user-interface vty 10",
+        " authentication-mode aaa",
+        "#",
+        "ntp-service server disable",
+        "ntp-service source-interface LoopBack0",
+        "#",
+        "user-interface vty 16 17",
+        " authentication-mode aaa",
+    ]
+    assert HuaweiCT._remove_spaces(src) == "\n".join(HuaweiCT._remove_spaces_lines(src.splitlines()))